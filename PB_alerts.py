@@ -0,0 +1,340 @@
+import json
+import math
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from PB_codec import CODEC_COMPACT
+from PB_protocol import encode_payload
+
+# Campos que podem ser vigiados em cada métrica; um campo com lista vira uma instância por item (ex.: por núcleo)
+alert_fields = {
+    "cpu": ["usage", "cores_usage"],
+    "ram": ["percent_usage", "used_gb", "available_gb"],
+    "disk": ["used_percent", "used_gb", "available_gb"],
+    "processes": ["used_memory", "memory_use_percent", "cpu_percent", "used_threads", "read_rate", "write_rate"],
+}
+
+comparisons = {">": np.greater, ">=": np.greater_equal, "<": np.less, "<=": np.less_equal}
+
+# Um processo é identificado pelo pid e pela data de criação, já que o sistema reaproveita pids
+process_key_dtype = np.dtype([("pid", np.int64), ("created_date", "U32")])
+
+
+class AlertRuleError(ValueError):
+    """Regra de alerta inválida"""
+
+
+class FieldValues(object):
+    """Valores de um campo em uma amostra, extraídos uma vez e compartilhados pelas regras do mesmo campo"""
+
+    def __init__(self, metric: str, field: str, data, timestamp: float, previous=None):
+        self.timestamp = timestamp
+        self.names = None
+
+        if metric == "processes":
+            self.keys = np.array([(row["pid"], row["created_date"]) for row in data], dtype=process_key_dtype)
+            self.values = np.array([row.get(field) for row in data], dtype=np.float64)
+            self.names = [row.get("name") or "" for row in data]
+        else:
+            value = data.get(field)
+            values = value if isinstance(value, (list, tuple)) else [value]
+
+            # Campos com lista usam o índice como instância; os escalares têm uma única instância, None
+            self.keys = np.arange(len(values)) if isinstance(value, (list, tuple)) else np.array([-1])
+            self.values = np.array(values, dtype=np.float64)
+
+        self._previous = previous
+        self._rates = None
+        self._matches = {}
+        self._index = None
+
+    def rates(self) -> np.ndarray:
+        """Variação por segundo desde a amostra anterior; NaN para instâncias novas"""
+        if self._rates is None:
+            previous = self._previous
+            self._rates = np.full(len(self.values), np.nan)
+
+            if previous is not None and self.timestamp > previous.timestamp:
+                elapsed = self.timestamp - previous.timestamp
+
+                if np.array_equal(self.keys, previous.keys):
+                    self._rates = (self.values - previous.values) / elapsed
+                elif len(previous.keys):
+                    # Processos entram e saem: alinha pelo pid e pela data de criação
+                    order = np.argsort(previous.keys)
+                    sorted_keys = previous.keys[order]
+                    positions = np.minimum(np.searchsorted(sorted_keys, self.keys), len(sorted_keys) - 1)
+                    found = sorted_keys[positions] == self.keys
+                    previous_values = previous.values[order][positions]
+
+                    self._rates[found] = (self.values[found] - previous_values[found]) / elapsed
+
+            # A amostra anterior só é necessária uma vez
+            self._previous = None
+
+        return self._rates
+
+    def matches(self, pattern: str) -> np.ndarray:
+        """Máscara das instâncias cujo nome contém pattern; só se aplica à tabela de processos"""
+        mask = self._matches.get(pattern)
+
+        if mask is None:
+            needle = pattern.lower()
+            mask = np.fromiter((needle in name.lower() for name in self.names), dtype=bool, count=len(self.names))
+            self._matches[pattern] = mask
+
+        return mask
+
+    def index(self, key):
+        """Posição de uma instância na amostra, ou None se ela não está mais presente"""
+        if self._index is None:
+            self._index = {key: index for index, key in enumerate(self.keys.tolist())}
+
+        return self._index.get(key)
+
+    def name(self, index: int):
+        return self.names[index] if self.names is not None else None
+
+
+class AlertRule(object):
+    """Regra compilada: compara o valor (ou a variação por segundo) de um campo com um limite.
+
+    Uma instância que passa do limite fica pendente e só dispara depois de for_seconds seguidos;
+    o alerta é resolvido na primeira amostra em que ela volta ao normal ou desaparece."""
+
+    def __init__(
+        self,
+        name: str,
+        metric: str,
+        field: str,
+        value: float,
+        op: str = ">",
+        for_seconds: float = 0.0,
+        rate: bool = False,
+        match: str = None,
+        severity: str = "warning",
+    ):
+        if metric not in alert_fields:
+            raise AlertRuleError(f"Métrica inválida na regra {name}: {metric}")
+        if field not in alert_fields[metric]:
+            raise AlertRuleError(f"Campo inválido na regra {name}: {metric}.{field}")
+        if op not in comparisons:
+            raise AlertRuleError(f"Comparação inválida na regra {name}: {op}")
+        if not isinstance(value, (int, float)) or not isinstance(for_seconds, (int, float)) or for_seconds < 0:
+            raise AlertRuleError(f"Limite ou duração inválidos na regra {name}")
+        if match is not None and metric != "processes":
+            raise AlertRuleError(f"Filtro de nome só se aplica a processos, na regra {name}")
+
+        self.name = name
+        self.metric = metric
+        self.field = field
+        self.value = float(value)
+        self.op = op
+        self.for_seconds = float(for_seconds)
+        self.rate = bool(rate)
+        self.match = match
+        self.severity = severity
+
+        self._compare = comparisons[op]
+        # Instância -> horário (monotônico) em que passou do limite, e instância -> alerta disparado
+        self._pending = {}
+        self._firing = {}
+
+    @classmethod
+    def from_dict(cls, config: dict):
+        if not isinstance(config, dict):
+            raise AlertRuleError("Cada regra deve ser um dicionário")
+
+        options = dict(config)
+        options["for_seconds"] = options.pop("for", 0.0)
+
+        try:
+            return cls(**options)
+        except TypeError as error:
+            raise AlertRuleError(f"Parâmetro inválido na regra {config.get('name')}: {error}") from None
+
+    def evaluate(self, values: FieldValues, wall_time: float) -> list:
+        """Atualiza o estado das instâncias com uma amostra e retorna os eventos de disparo e resolução"""
+        current = values.rates() if self.rate else values.values
+
+        with np.errstate(invalid="ignore"):
+            mask = self._compare(current, self.value)
+
+        if self.match is not None:
+            mask &= values.matches(self.match)
+
+        indexes = np.flatnonzero(mask)
+
+        # Caso comum: nada passou do limite e não havia nada pendente
+        if not len(indexes) and not self._pending and not self._firing:
+            return []
+
+        timestamp = values.timestamp
+        keys = values.keys[indexes].tolist()
+        matched = set(keys)
+        events = []
+
+        for key in [key for key in self._firing if key not in matched]:
+            since = self._firing.pop(key)
+            index = values.index(key)
+
+            if index is None:
+                # A instância desapareceu (ex.: o processo terminou)
+                events.append(self._event("resolved", key, None, None, since, wall_time))
+            else:
+                events.append(
+                    self._event("resolved", key, values.name(index), float(current[index]), since, wall_time)
+                )
+
+        for key in [key for key in self._pending if key not in matched]:
+            del self._pending[key]
+
+        for key, index in zip(keys, indexes.tolist()):
+            if key in self._firing:
+                continue
+
+            pending_since = self._pending.setdefault(key, timestamp)
+
+            if timestamp - pending_since >= self.for_seconds:
+                del self._pending[key]
+
+                since = wall_time - (timestamp - pending_since)
+                self._firing[key] = since
+                events.append(self._event("firing", key, values.name(index), float(current[index]), since, wall_time))
+
+        return events
+
+    def _event(self, state: str, key, name: str, value, since: float, wall_time: float) -> dict:
+        return {
+            "rule": self.name,
+            "severity": self.severity,
+            "state": state,
+            "metric": self.metric,
+            "field": self.field,
+            "rate": self.rate,
+            # Processos são identificados pelo pid nos eventos
+            "instance": key[0] if isinstance(key, tuple) else None if key == -1 else key,
+            "name": name,
+            # Uma variação sem amostra anterior (NaN) é enviada como None
+            "value": None if value is None or math.isnan(value) else value,
+            "op": self.op,
+            "threshold": self.value,
+            "since": since,
+            "timestamp": wall_time,
+        }
+
+
+class AlertEngine(object):
+    """Avalia as regras a cada amostra do Sampler e guarda os eventos em uma sequência lida pelos clientes"""
+
+    def __init__(self, rules: list, log_path: str = None, history: int = 1000):
+        self.rules = rules
+        self.sequence = 0
+        self.log_path = log_path
+        # Duração da última avaliação de cada métrica, em segundos
+        self.evaluation_times = {}
+
+        self._rules_by_metric = {}
+
+        for rule in rules:
+            self._rules_by_metric.setdefault(rule.metric, []).append(rule)
+
+        # Só os campos com regras de variação precisam guardar a amostra anterior
+        self._rate_fields = {(rule.metric, rule.field) for rule in rules if rule.rate}
+        self._previous = {}
+
+        self._events = deque(maxlen=history)
+        self._active = {}
+        self._lock = threading.Lock()
+        self._log = open(log_path, "a", encoding="utf-8", buffering=1) if log_path else None
+
+    @classmethod
+    def load(cls, path: str, log_path: str = None):
+        """Lê as regras de um arquivo JSON: uma lista de regras ou {"rules": [...]}"""
+        with open(path, encoding="utf-8") as rules_file:
+            config = json.load(rules_file)
+
+        if isinstance(config, dict):
+            config = config.get("rules", [])
+
+        if not isinstance(config, list):
+            raise AlertRuleError("O arquivo de regras deve conter uma lista de regras")
+
+        rules = [AlertRule.from_dict(rule) for rule in config]
+        names = [rule.name for rule in rules]
+
+        if len(set(names)) != len(names):
+            raise AlertRuleError("Os nomes das regras devem ser únicos")
+
+        return cls(rules, log_path)
+
+    def evaluate(self, snapshot):
+        """Ouvinte do Sampler: só as regras da métrica amostrada são avaliadas"""
+        rules = self._rules_by_metric.get(snapshot.name)
+
+        if not rules:
+            return
+
+        started = time.perf_counter()
+        wall_time = time.time()
+        fields = {}
+        events = []
+
+        for rule in rules:
+            values = fields.get(rule.field)
+
+            if values is None:
+                key = (rule.metric, rule.field)
+                values = FieldValues(rule.metric, rule.field, snapshot.data, snapshot.timestamp, self._previous.get(key))
+                fields[rule.field] = values
+
+                if key in self._rate_fields:
+                    self._previous[key] = values
+
+            events.extend(rule.evaluate(values, wall_time))
+
+        if events:
+            self._publish(events)
+
+        self.evaluation_times[snapshot.name] = time.perf_counter() - started
+
+    def _publish(self, events: list):
+        with self._lock:
+            for event in events:
+                self.sequence += 1
+                event["sequence"] = self.sequence
+                self._events.append(event)
+
+                key = (event["rule"], event["instance"])
+
+                if event["state"] == "firing":
+                    self._active[key] = event
+                else:
+                    self._active.pop(key, None)
+
+                if self._log is not None:
+                    self._log.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+                print(f"Alerta {event['rule']} ({event['state']}): {event['metric']}.{event['field']} = {event['value']}")
+
+    def body(self, since: int, codec: int = CODEC_COMPACT):
+        """Eventos posteriores a since e os alertas ativos; retorna a sequência atual e a resposta serializada"""
+        with self._lock:
+            events = [event for event in self._events if event["sequence"] > since]
+            response = {
+                "sequence": self.sequence,
+                # Se o cliente perdeu eventos que já saíram da fila, os alertas ativos bastam para reconstruir o estado
+                "complete": not since or not self._events or self._events[0]["sequence"] <= since + 1,
+                "events": events,
+                "active": list(self._active.values()),
+            }
+
+            return self.sequence, encode_payload(response, codec)
+
+    def close(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
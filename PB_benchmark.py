@@ -0,0 +1,237 @@
+import argparse
+import asyncio
+import random
+import time
+
+from PB_codec import codecs
+from PB_processes import ProcessQuery
+
+
+def sample_payloads(cores: int, processes: int) -> dict:
+    """Gera dados com o mesmo formato das respostas do servidor"""
+    rng = random.Random(42)
+    names = ["python", "bash", "systemd", "sshd", "postgres", "nginx", "java", "chrome"]
+
+    process_rows = [
+        {
+            "pid": pid,
+            "name": rng.choice(names),
+            "created_date": time.ctime(1_700_000_000 + pid),
+            "used_memory": rng.random() * 2048,
+            "memory_use_percent": rng.random() * 10,
+            "used_threads": rng.randint(1, 64),
+            "cpu_time": rng.random() * 1000,
+            "cpu_percent": round(rng.random() * 100, 1),
+            "read_rate": float(rng.randint(0, 1 << 20)),
+            "write_rate": float(rng.randint(0, 1 << 20)),
+            "ctx_switch_rate": float(rng.randint(0, 5000)),
+        }
+        for pid in range(processes, 0, -1)
+    ]
+
+    return {
+        "cpu": {
+            "current_frequency": 2100.0,
+            "usage": 37.5,
+            "cores_usage": [round(rng.random() * 100, 1) for _ in range(cores)],
+        },
+        "ram": {
+            "total_gb": 31.26,
+            "used_gb": 12.4,
+            "available_gb": 18.86,
+            "percent_usage": 39.7,
+            "percent_available": 60.3,
+            "total_bytes": 33564778496,
+            "used_bytes": 13314398618,
+            "available_bytes": 20250379878,
+        },
+        "disk": {
+            "gize_gb": 465.63,
+            "used_gb": 201.12,
+            "available_gb": 264.51,
+            "used_percent": 43.2,
+            "available_percent": 56.8,
+            "total_bytes": 499968020480,
+            "used_bytes": 215952998400,
+            "available_bytes": 284015022080,
+        },
+        "processes": process_rows,
+        "processes_top20": ProcessQuery(limit=20).run(process_rows),
+        "processes_delta": {
+            "sequence": 2,
+            "base": 1,
+            "full": False,
+            "deltas": [{
+                "sequence": 2,
+                "added": process_rows[:5],
+                "removed": [1, 2, 3],
+                "changed": {row["pid"]: {"used_memory": row["used_memory"] + 1} for row in process_rows[:200]},
+            }],
+        },
+        # Diferença típica de uma amostra com muitos processos ativos: tempo e uso de CPU e memória mudam juntos
+        "processes_delta_busy": {
+            "sequence": 3,
+            "base": 2,
+            "full": False,
+            "deltas": [{
+                "sequence": 3,
+                "added": process_rows[:20],
+                "removed": list(range(1, 21)),
+                "changed": {
+                    row["pid"]: {
+                        "used_memory": row["used_memory"] + 1,
+                        "cpu_time": row["cpu_time"] + 0.5,
+                        "cpu_percent": round(rng.random() * 100, 1),
+                    }
+                    for row in process_rows[:processes // 2]
+                },
+            }],
+        },
+        # Primeira resposta de uma assinatura da tabela, com a tabela inteira dentro do formato genérico
+        "processes_stream": {"sequence": 1, "full": True, "processes": process_rows},
+    }
+
+
+def measure(function, repeat: int) -> float:
+    """Tempo médio de uma chamada, em microssegundos"""
+    started = time.perf_counter()
+
+    for _ in range(repeat):
+        function()
+
+    return (time.perf_counter() - started) / repeat * 1_000_000
+
+
+def measure_charts(cores: int, repeat: int):
+    """Mede o caminho do gráfico até a tela em cada backend: desenho na superfície e cópia para a janela"""
+    import pygame
+
+    from PB_charts import backends
+
+    pygame.init()
+    rng = random.Random(42)
+    screen = pygame.Surface((900, 600))
+    colors = ["#" + "".join(rng.choice("0123456789ABCDEF") for _ in range(6)) for _ in range(cores + 1)]
+
+    print(f"{'backend':<12} {'séries':>8} {'gráfico (ms)':>14} {'tela (ms)':>11}")
+
+    for name, chart_class in backends.items():
+        chart = chart_class(figsize=[7, 4], dpi=75, xlim=(1, 10), ylim=(0, 100), y_formatter=lambda y, _: f"{y}%")
+        series = [[rng.random() * 100 for _ in range(10)] for _ in range(cores + 1)]
+        labels = [f"Núcleo {index} ({values[-1]:.1f}%)" for index, values in enumerate(series)]
+
+        chart.render(series, labels, colors)
+        chart.render_times.clear()
+
+        blit_time = measure(lambda: screen.blit(chart.render(series, labels, colors), (300, 150)), repeat)
+        chart_time = chart.average_render_time() * 1000
+
+        print(f"{name:<12} {len(series):>8} {chart_time:>14.2f} {blit_time / 1000 - chart_time:>11.2f}")
+
+
+async def _measure_fleet(agents: int, base_port: int, cores: int, repeat: int):
+    # Importados aqui para que as outras medições não dependam do psutil e das bibliotecas do servidor
+    from PB_collector import FleetCollector, FleetQuery
+    from PB_sampler import Sampler
+    from PB_server import MonitoringServer
+
+    rng = random.Random(42)
+
+    def agent_sampler(index):
+        collectors = {
+            "facts": lambda: {"system": {"name": f"agente-{index}"}},
+            "cpu": lambda: {"usage": rng.random() * 100, "cores_usage": [rng.random() * 100 for _ in range(cores)]},
+            "ram": lambda: {"percent_usage": rng.random() * 100, "used_gb": rng.random() * 64},
+        }
+
+        return Sampler(collectors, {"cpu": 1.0, "ram": 1.0})
+
+    servers = [MonitoringServer("127.0.0.1", base_port + index, agent_sampler(index), workers=1) for index in range(agents)]
+    server_tasks = [asyncio.create_task(server.serve()) for server in servers]
+    await asyncio.sleep(0.5)
+
+    collector = FleetCollector([f"127.0.0.1:{server.port}" for server in servers], interval=1.0, timeout=1.0)
+    started = time.perf_counter()
+    collector.start()
+
+    async def wait_for(state, count):
+        while collector.fleet()["states"][state] < count:
+            await asyncio.sleep(0.05)
+
+        return time.perf_counter() - started
+
+    print(f"{agents} agentes ativos em {await wait_for('up', agents):.2f} s")
+
+    query = FleetQuery(sort="cpu", limit=10)
+    query_time = measure(lambda: query.run(collector.fleet()), repeat)
+    print(f"top 10 por CPU: {query_time:.0f} µs por consulta")
+
+    # Derruba um décimo dos agentes, como máquinas que caíram, e espera o coletor perceber
+    dead = servers[::10]
+
+    for server, task in zip(servers[::10], server_tasks[::10]):
+        task.cancel()
+
+        for client in list(server.clients):
+            client.transport.abort()
+
+    started = time.perf_counter()
+    print(f"{len(dead)} agentes derrubados marcados como fora em {await wait_for('down', len(dead)):.2f} s")
+
+    fleet = collector.fleet()
+    print(f"estados: {fleet['states']}, top 10 ainda responde com {len(query.run(fleet)['hosts'])} hosts")
+
+    await collector.stop()
+
+    for server, task in zip(servers, server_tasks):
+        server.sampler.stop()
+        task.cancel()
+
+    await asyncio.gather(*server_tasks, return_exceptions=True)
+
+
+def measure_fleet(agents: int, base_port: int, cores: int, repeat: int):
+    """Sobe vários servidores com métricas sintéticas em portas locais e mede o coletor sobre eles"""
+    asyncio.run(_measure_fleet(agents, base_port, cores, repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara os formatos de serialização das mensagens")
+    parser.add_argument("--cores", type=int, default=64, help="número de núcleos na amostra de CPU")
+    parser.add_argument("--processes", type=int, default=3000, help="número de processos na tabela de exemplo")
+    parser.add_argument("--repeat", type=int, default=200, help="repetições de cada medição")
+    parser.add_argument("--charts", action="store_true", help="mede os backends de gráfico em vez dos formatos")
+    parser.add_argument("--fleet", type=int, metavar="AGENTES", help="mede o coletor com AGENTES servidores locais")
+    parser.add_argument("--fleet-port", type=int, default=5700, help="primeira porta dos servidores locais")
+    args = parser.parse_args()
+
+    if args.charts:
+        measure_charts(args.cores, max(1, args.repeat // 10))
+        return
+
+    if args.fleet:
+        measure_fleet(args.fleet, args.fleet_port, args.cores, args.repeat)
+        return
+
+    payloads = sample_payloads(args.cores, args.processes)
+
+    print(f"{'métrica':<22} {'formato':<8} {'bytes':>10} {'codificar (µs)':>16} {'decodificar (µs)':>18}")
+
+    for name, payload in payloads.items():
+        schema = name if name in ("cpu", "ram", "disk", "processes") else None
+        repeat = max(1, args.repeat // 50) if name.startswith("processes") else args.repeat
+
+        for codec in codecs.values():
+            body = codec.encode(payload, schema)
+
+            if codec.decode(body) != payload:
+                raise SystemExit(f"{codec.name} não preservou os dados de {name}")
+
+            encode_time = measure(lambda: codec.encode(payload, schema), repeat)
+            decode_time = measure(lambda: codec.decode(body), repeat)
+
+            print(f"{name:<22} {codec.name:<8} {len(body):>10} {encode_time:>16.1f} {decode_time:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
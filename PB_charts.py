@@ -0,0 +1,302 @@
+import collections
+import time
+
+import numpy as np
+import pygame
+
+# Backend usado quando nenhum outro é pedido; o matplotlib só é importado se for escolhido
+default_backend = "pygame"
+
+
+class LineChart(object):
+    """Base dos gráficos de linhas: mede o tempo de cada atualização, do dado até a superfície pronta para a tela"""
+
+    def __init__(self, size: tuple):
+        self.size = size
+        # Duas superfícies alternadas, para não desenhar na que ainda pode estar sendo exibida
+        self._surfaces = [pygame.Surface(size), pygame.Surface(size)]
+        self._current = 0
+        self.render_times = collections.deque(maxlen=100)
+
+    def _next_surface(self) -> pygame.Surface:
+        surface = self._surfaces[self._current]
+        self._current = 1 - self._current
+
+        return surface
+
+    def render(self, series: list, labels: list, colors: list) -> pygame.Surface:
+        """Desenha as séries e retorna o gráfico como uma superfície do pygame"""
+        started = time.perf_counter()
+        surface = self._draw(self._next_surface(), series, labels, colors)
+        self.render_times.append(time.perf_counter() - started)
+
+        return surface
+
+    def average_render_time(self) -> float:
+        """Tempo médio das últimas atualizações, em segundos"""
+        return sum(self.render_times) / len(self.render_times) if self.render_times else 0.0
+
+    def _draw(self, surface: pygame.Surface, series: list, labels: list, colors: list) -> pygame.Surface:
+        raise NotImplementedError
+
+
+class PygameLineChart(LineChart):
+    """Gráfico de linhas desenhado direto com primitivas do pygame, sem passar pelo matplotlib"""
+
+    background_color = (255, 255, 255)
+    axes_color = (0, 0, 0)
+    text_color = (0, 0, 0)
+    legend_border_color = (204, 204, 204)
+
+    def __init__(self, figsize=(7, 4), dpi: int = 75, xlim=(1, 10), ylim=(0, 100), y_formatter=None):
+        super().__init__((round(figsize[0] * dpi), round(figsize[1] * dpi)))
+        self.xlim = xlim
+        self.ylim = ylim
+        self.y_formatter = y_formatter
+
+        self.font = pygame.font.Font(None, max(12, dpi // 5))
+
+        # Mesmas margens que o matplotlib usa por padrão ao redor da área do gráfico
+        width, height = self.size
+        self.plot_rect = pygame.Rect(
+            round(width * 0.125), round(height * 0.12), round(width * 0.775), round(height * 0.76)
+        )
+
+        self._background = self._draw_background()
+
+        self._legend_labels = []
+        self._legend_texts = []
+
+    def _draw_background(self) -> pygame.Surface:
+        """Desenha uma vez o fundo, os eixos e os rótulos das marcações"""
+        surface = pygame.Surface(self.size)
+        surface.fill(self.background_color)
+
+        rect = self.plot_rect
+        pygame.draw.rect(surface, self.axes_color, rect, 1)
+
+        y_min, y_max = self.ylim
+
+        for tick in np.linspace(y_min, y_max, 6):
+            tick = int(tick) if float(tick).is_integer() else float(tick)
+            y = self._to_y(np.array([tick]))[0]
+            label = self.y_formatter(tick, None) if self.y_formatter is not None else str(tick)
+            text = self.font.render(label, True, self.text_color)
+
+            pygame.draw.line(surface, self.axes_color, (rect.left - 4, y), (rect.left, y))
+            surface.blit(text, (rect.left - 6 - text.get_width(), y - text.get_height() // 2))
+
+        x_min, x_max = self.xlim
+
+        for tick in range(int(x_min), int(x_max) + 1):
+            x = self._to_x(np.array([tick]))[0]
+            text = self.font.render(str(tick), True, self.text_color)
+
+            pygame.draw.line(surface, self.axes_color, (x, rect.bottom - 1), (x, rect.bottom + 3))
+            surface.blit(text, (x - text.get_width() // 2, rect.bottom + 5))
+
+        return surface
+
+    def _to_x(self, values: np.ndarray) -> np.ndarray:
+        x_min, x_max = self.xlim
+        return self.plot_rect.left + (values - x_min) * ((self.plot_rect.width - 1) / (x_max - x_min))
+
+    def _to_y(self, values: np.ndarray) -> np.ndarray:
+        y_min, y_max = self.ylim
+        values = np.clip(values, y_min, y_max)
+        return self.plot_rect.bottom - 1 - (values - y_min) * ((self.plot_rect.height - 1) / (y_max - y_min))
+
+    def _update_legend(self, labels: list):
+        """Renderiza de novo só os textos da legenda que mudaram desde a última atualização"""
+        if len(labels) != len(self._legend_labels):
+            self._legend_labels = [None] * len(labels)
+            self._legend_texts = [None] * len(labels)
+
+        for index, label in enumerate(labels):
+            if self._legend_labels[index] != label:
+                self._legend_labels[index] = label
+                self._legend_texts[index] = self.font.render(label, True, self.text_color)
+
+    def _draw_legend(self, surface: pygame.Surface, colors: list):
+        if not self._legend_texts:
+            return
+
+        line_height = self.font.get_linesize()
+        swatch = 2 * line_height
+        text_width = max(text.get_width() for text in self._legend_texts)
+
+        left = self.plot_rect.left + 6
+        top = self.plot_rect.top + 6
+        box = pygame.Rect(left, top, swatch + text_width + 14, line_height * len(self._legend_texts) + 8)
+        box = box.clip(self.plot_rect.inflate(-2, -2))
+
+        surface.fill(self.background_color, box)
+        pygame.draw.rect(surface, self.legend_border_color, box, 1)
+
+        y = top + 4
+
+        for text, color in zip(self._legend_texts, colors):
+            if y + line_height > box.bottom:
+                break
+
+            middle = y + line_height // 2
+            pygame.draw.line(surface, color, (left + 4, middle), (left + 4 + swatch, middle), 2)
+            surface.blit(text, (left + swatch + 10, y))
+            y += line_height
+
+    def _draw(self, surface: pygame.Surface, series: list, labels: list, colors: list) -> pygame.Surface:
+        """Desenha as séries sobre o fundo em cache"""
+        surface.blit(self._background, (0, 0))
+        surface.set_clip(self.plot_rect.inflate(-2, -2))
+
+        for values, color in zip(series, colors):
+            if len(values) < 2:
+                continue
+
+            xs = self._to_x(np.arange(1, len(values) + 1))
+            ys = self._to_y(np.asarray(values, dtype=np.float64))
+            pygame.draw.lines(surface, color, False, np.column_stack((xs, ys)).tolist(), 2)
+
+        self._update_legend(labels)
+        self._draw_legend(surface, colors)
+        surface.set_clip(None)
+
+        return surface
+
+
+class MatplotlibLineChart(LineChart):
+    """Gráfico de linhas que cria as linhas uma vez e, a cada atualização, redesenha só elas sobre o fundo em cache"""
+
+    def __init__(self, figsize=(7, 4), dpi: int = 75, xlim=(1, 10), ylim=(0, 100), y_formatter=None):
+        # Importado aqui para que o cliente não carregue o matplotlib se usar o backend do pygame
+        import matplotlib
+
+        matplotlib.use("Agg")
+
+        from matplotlib.backends import backend_agg
+        from matplotlib.figure import Figure
+        from matplotlib.ticker import FuncFormatter
+
+        self.figure = Figure(figsize=figsize, dpi=dpi)
+        self.axes = self.figure.gca()
+
+        self.axes.set_xlim(*xlim)
+        self.axes.set_ylim(*ylim)
+
+        if y_formatter is not None:
+            self.axes.yaxis.set_major_formatter(FuncFormatter(y_formatter))
+
+        self.canvas = backend_agg.FigureCanvasAgg(self.figure)
+        self.renderer = self.canvas.get_renderer()
+
+        super().__init__(self.canvas.get_width_height())
+
+        # Superfície que lê direto o buffer RGBA do Agg, sem cópia; o byte de alpha é ignorado
+        self._agg_surface = pygame.image.frombuffer(self.renderer.buffer_rgba(), self.size, "RGBX")
+
+        self.lines = []
+        self.legend = None
+        self._background = None
+
+        # Caixa e amostras de cor da legenda, sem os textos, e os textos que caem dentro da figura
+        self._legend_region = None
+        self._legend_sizes = []
+        self._visible_texts = []
+
+    def _create_lines(self, colors: list, labels: list):
+        """Cria as linhas e a legenda; só acontece na primeira atualização ou se a quantidade de séries mudar"""
+        for line in self.lines:
+            line.remove()
+
+        if self.legend is not None:
+            self.legend.remove()
+
+        self.lines = [
+            self.axes.plot([], [], color, label=label, animated=True)[0]
+            for color, label in zip(colors, labels)
+        ]
+        self.legend = self.axes.legend(loc="upper left")
+        self.legend.set_animated(True)
+
+        self._background = None
+        self._legend_region = None
+
+    def _cache_background(self):
+        """Desenha a figura sem as partes animadas e guarda o resultado como fundo"""
+        self.canvas.draw()
+        self._background = self.canvas.copy_from_bbox(self.figure.bbox)
+
+    def _cache_legend(self, labels: list):
+        """Desenha a legenda sem os textos sobre o fundo e guarda a região; os textos são desenhados a cada
+        atualização. A legenda só é montada de novo quando um texto fica mais longo do que os usados no tamanho dela"""
+        from matplotlib.transforms import Bbox
+
+        texts = self.legend.get_texts()
+
+        for text, label in zip(texts, labels):
+            text.set_text(label)
+            text.set_alpha(0)
+
+        self.canvas.restore_region(self._background)
+        self.axes.draw_artist(self.legend)
+
+        extent = Bbox.intersection(self.legend.get_window_extent(self.renderer), self.figure.bbox)
+        self._legend_region = self.canvas.copy_from_bbox(extent)
+        self._legend_sizes = [len(label) for label in labels]
+        # Com muitas séries a legenda passa da borda da figura; os textos de fora não precisam ser desenhados
+        self._visible_texts = [
+            (index, text)
+            for index, text in enumerate(texts)
+            if text.get_window_extent(self.renderer).overlaps(self.figure.bbox)
+        ]
+
+        for text in texts:
+            text.set_alpha(None)
+
+    def _draw(self, surface: pygame.Surface, series: list, labels: list, colors: list) -> pygame.Surface:
+        """Atualiza os dados das linhas e os textos da legenda e copia o buffer do Agg para a superfície"""
+        if len(series) != len(self.lines):
+            self._create_lines(colors, labels)
+
+        if self._background is None:
+            self._cache_background()
+
+        if self._legend_region is None or any(map(int.__gt__, map(len, labels), self._legend_sizes)):
+            self._cache_legend(labels)
+
+        for line, values in zip(self.lines, series):
+            line.set_data(range(1, len(values) + 1), values)
+
+        self.canvas.restore_region(self._background)
+
+        for line in self.lines:
+            self.axes.draw_artist(line)
+
+        # A legenda fica por cima das linhas: a caixa vem da região em cache e só os textos são desenhados
+        self.canvas.restore_region(self._legend_region)
+
+        for index, text in self._visible_texts:
+            text.set_text(labels[index])
+            self.figure.draw_artist(text)
+
+        self.canvas.blit(self.figure.bbox)
+
+        surface.blit(self._agg_surface, (0, 0))
+
+        return surface
+
+
+backends = {
+    "pygame": PygameLineChart,
+    "matplotlib": MatplotlibLineChart,
+}
+
+
+def create_chart(backend: str = None, **options):
+    """Cria um gráfico de linhas com o backend pedido ("pygame" ou "matplotlib")"""
+    try:
+        chart_class = backends[backend or default_backend]
+    except KeyError:
+        raise ValueError(f"Backend de gráfico desconhecido: {backend}") from None
+
+    return chart_class(**options)
@@ -1,58 +1,72 @@
-import pickle
-import pylab
+import itertools
+import os
 import random
 import select
 import socket
 import sys
 import threading
 import time
-import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
 from queue import Queue
 
-import matplotlib
 import pygame
 import pygame_gui
 import pygame_menu
-from matplotlib.backends import backend_agg
-from matplotlib.ticker import FuncFormatter
 
-pygame.init()
+from PB_charts import create_chart, default_backend
+from PB_codec import CODEC_COMPACT
+from PB_history import decode_rollup
+from PB_timeseries import TimeSeriesStore
+from PB_views import Column, TableModel, TableView, TextView
+from PB_protocol import (
+    FrameReader,
+    MESSAGE_ERROR,
+    MESSAGE_PUSH,
+    MESSAGE_REQUEST,
+    MESSAGE_SUBSCRIBE,
+    MESSAGE_UNSUBSCRIBE,
+    ProtocolError,
+    ServerError,
+    decode_batch,
+    send_message,
+)
 
-matplotlib.use("Agg")
+pygame.init()
 
 width = 900
 height = 600
 
+# Quantidade de amostras guardadas no histórico de cada métrica e quantas aparecem nos gráficos
+history_depth = 3600
+graph_points = 10
 
-def run_in_thread(function):
-    """Decorador que executa uma função como thread"""
-
-    def run(*args, **kwargs):
-        thread = threading.Thread(target=function, daemon=True, args=args, kwargs=kwargs)
-        thread.start()
-
-        return thread
-
-    return run
-
-
-def divide_chunks(l, n):
-    """Divide uma lista em partes com o tamanho n"""
-    for i in range(0, len(l), n):  
-        yield l[i:i + n] 
+# Backend dos gráficos; PB_CHART_BACKEND=matplotlib volta a usar o matplotlib
+chart_backend = os.environ.get("PB_CHART_BACKEND", default_backend)
 
 
 class SocketManager(object):
     """Gerencia a troca de mensagens com o servidor"""
 
-    def __init__(self):
-        """Cria o objeto socket e a fila de mensagens"""
+    def __init__(self, workers: int = 4, request_timeout: float = 10.0, codec: int = CODEC_COMPACT):
+        """Cria o objeto socket, as requisições pendentes e o pool que executa as respostas"""
         self._socket_object = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 
-        self.queue_inputs = Queue()
-        self.outputs = {}
+        self.codec = codec
+        self._frame_reader = FrameReader(allowed_codecs=(codec,))
+        self._request_ids = itertools.count(1)
+        self._send_lock = threading.Lock()
+
+        self.request_timeout = request_timeout
+
+        # request_id -> (future, prazo da resposta)
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="respostas")
 
-        self.lock_outputs = threading.Lock()
+        self._subscriptions = {}
+        self._queue_pushes = Queue()
 
         self._loop_thread = None
         self._loop_running = True
@@ -64,62 +78,199 @@ class SocketManager(object):
         self._loop_thread = threading.Thread(target=self._loop, daemon=True)
         self._loop_thread.start()
 
-    @run_in_thread
-    def update_data(self, command, update_function):
-        """Adiciona uma mensagem a fila e aguarda ate receber uma resposta"""
-        request_uuid = str(uuid.uuid4())
-        self.queue_inputs.put({"uuid": request_uuid, "data": command})
+        threading.Thread(target=self._dispatch_pushes, daemon=True).start()
+
+    def _send(self, message_type: int, request_id: int, request):
+        with self._send_lock:
+            send_message(self._socket_object, message_type, request_id, request, self.codec)
+
+    def request(self, command, parameters=None, timeout: float = None) -> Future:
+        """Envia uma requisição e retorna um Future com a resposta; cancelar o Future descarta a resposta"""
+        request_id = next(self._request_ids)
+        future = Future()
+        deadline = time.monotonic() + (timeout if timeout is not None else self.request_timeout)
+
+        with self._pending_lock:
+            self._pending[request_id] = (future, deadline)
+
+        future.add_done_callback(lambda _: self._forget(request_id))
+
+        try:
+            self._send(MESSAGE_REQUEST, request_id, {"data": command, **(parameters or {})})
+        except OSError as error:
+            future.set_exception(error)
+
+        return future
+
+    def update_data(self, command, update_function, parameters=None, timeout: float = None) -> Future:
+        """Envia uma requisição e executa update_function com a resposta no pool de respostas"""
+        future = self.request(command, parameters, timeout)
+        future.add_done_callback(lambda done: self._run_update(done, command, update_function))
+
+        return future
+
+    def _run_update(self, future: Future, command, update_function):
+        if future.cancelled():
+            return
+
+        error = future.exception()
+
+        if error is not None:
+            print(f"Falha na requisição {command}: {error}")
+            return
+
+        try:
+            self._executor.submit(update_function, future.result())
+        except RuntimeError:
+            pass
+
+    def update_batch(self, requests: list, update_functions: list, timeout: float = None) -> Future:
+        """Pede várias métricas em uma única mensagem e executa a função de cada uma com o seu resultado, em ordem"""
+        future = self.request("batch", {"requests": requests}, timeout)
+        future.add_done_callback(lambda done: self._run_batch_update(done, requests, update_functions))
+
+        return future
+
+    def _run_batch_update(self, future: Future, requests: list, update_functions: list):
+        if future.cancelled():
+            return
+
+        error = future.exception()
+
+        if error is not None:
+            print(f"Falha na requisição em lote: {error}")
+            return
 
+        try:
+            results = decode_batch(future.result(), self.codec)
+        except Exception as error:
+            print(f"Resposta em lote inválida: {error}")
+            return
+
+        try:
+            self._executor.submit(self._apply_batch, requests, update_functions, results)
+        except RuntimeError:
+            pass
+
+    @staticmethod
+    def _apply_batch(requests: list, update_functions: list, results: list):
+        for request, update_function, result in zip(requests, update_functions, results):
+            if isinstance(result, ServerError):
+                print(f"Falha na requisição {request.get('data')}: {result}")
+                continue
+
+            update_function(result)
+
+    def _forget(self, request_id: int):
+        with self._pending_lock:
+            self._pending.pop(request_id, None)
+
+    def subscribe(self, command, update_function, interval: float, parameters=None) -> int:
+        """Pede ao servidor para enviar a métrica a cada interval segundos e retorna o id da assinatura"""
+        subscription_id = next(self._request_ids)
+        self._subscriptions[subscription_id] = update_function
+
+        self._send(MESSAGE_SUBSCRIBE, subscription_id, {"data": command, "interval": interval, **(parameters or {})})
+
+        return subscription_id
+
+    def unsubscribe(self, subscription_id: int):
+        """Cancela uma assinatura, descartando os envios que ainda estiverem a caminho"""
+        self._subscriptions.pop(subscription_id, None)
+
+        self._send(MESSAGE_UNSUBSCRIBE, subscription_id, None)
+
+    def _dispatch_pushes(self):
+        """Entrega os dados das assinaturas às páginas, na ordem em que chegaram"""
         while True:
-            with self.lock_outputs:
-                if request_uuid in self.outputs.keys():
-                    data = self.outputs[request_uuid]
-                    self.outputs.pop(request_uuid)
+            push = self._queue_pushes.get()
 
-                    break
+            if push is None:
+                break
 
-        update_function(data)
+            subscription_id, data = push
+            update_function = self._subscriptions.get(subscription_id)
 
-    def _loop(self):
-        """Troca mensagens com o servidor"""
-        while self._loop_running:
-            available_sockets = select.select([self._socket_object], [self._socket_object], [])
+            if update_function is not None:
+                try:
+                    update_function(data)
+                except Exception as error:
+                    print(f"Falha ao atualizar a página: {error!r}")
 
-            if available_sockets[0]:
-                data_fragments = []
+    def _complete(self, request_id: int, result=None, error: Exception = None):
+        """Resolve o Future de uma requisição pendente"""
+        with self._pending_lock:
+            pending = self._pending.get(request_id)
 
-                complete_data = False
+        if pending is None:
+            return
 
-                while not complete_data:
-                    received_data = self._socket_object.recv(1024)
+        future = pending[0]
 
-                    try:
-                        formated_data = pickle.loads(received_data)
+        if not future.set_running_or_notify_cancel():
+            return
 
-                        with self.lock_outputs:
-                            self.outputs[formated_data["uuid"]] = formated_data["data"]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
 
-                        complete_data = True
-                    except:
-                        data_fragments.append(received_data)
+    def _expire_requests(self) -> float:
+        """Falha as requisições que passaram do prazo e retorna quanto tempo falta para o próximo prazo"""
+        now = time.monotonic()
 
-                        try:
-                            formated_data = pickle.loads(b"".join(data_fragments))
+        with self._pending_lock:
+            expired = [request_id for request_id, (_, deadline) in self._pending.items() if deadline <= now]
+            next_deadline = min((deadline for _, deadline in self._pending.values() if deadline > now), default=None)
 
-                            with self.lock_outputs:
-                                self.outputs[formated_data["uuid"]] = formated_data["data"]
+        for request_id in expired:
+            self._complete(request_id, error=TimeoutError(f"Sem resposta para a requisição {request_id}"))
 
-                            complete_data = True
-                        except:
-                            pass
+        if next_deadline is None:
+            return 1.0
+
+        return min(1.0, next_deadline - now)
+
+    def _loop(self):
+        """Recebe as mensagens do servidor e as entrega às requisições e assinaturas"""
+        try:
+            while self._loop_running:
+                readable, _, _ = select.select([self._socket_object], [], [], self._expire_requests())
 
-            elif available_sockets[1] and not self.queue_inputs.empty():
-                self._socket_object.send(pickle.dumps(self.queue_inputs.get()))
+                if not readable:
+                    continue
+
+                if not self._frame_reader.receive(self._socket_object):
+                    break
+
+                for message_type, request_id, data, _ in self._frame_reader.messages():
+                    if message_type == MESSAGE_PUSH:
+                        self._queue_pushes.put((request_id, data))
+                    elif message_type == MESSAGE_ERROR:
+                        if request_id in self._subscriptions:
+                            print(f"Erro do servidor: {data}")
+                        else:
+                            self._complete(request_id, error=ServerError(data))
+                    else:
+                        self._complete(request_id, data)
+        except (OSError, ValueError, ProtocolError) as error:
+            print(f"Conexão com o servidor interrompida: {error}")
+        finally:
+            with self._pending_lock:
+                pending = list(self._pending)
+
+            for request_id in pending:
+                self._complete(request_id, error=ConnectionError("Conexão com o servidor encerrada"))
 
     def close(self):
         """Encerra a conexão com o servidor"""
         self._loop_running = False
-        self._loop_thread.join()
+
+        if self._loop_thread is not None:
+            self._loop_thread.join()
+
+        self._queue_pushes.put(None)
+        self._executor.shutdown(wait=False, cancel_futures=True)
         self._socket_object.close()
 
 
@@ -135,6 +286,17 @@ class ScreenManager(object):
         """Adiciona uma página"""
         self._pages[page.name] = page
 
+    def set_current_page(self, name: str):
+        """Troca a página atual, cancelando as assinaturas da página anterior"""
+        if name == self.current_page:
+            return
+
+        if self.current_page is not None:
+            self._pages[self.current_page].hide()
+
+        self.current_page = name
+        self._pages[name].show()
+
     def show_current_page(self):
         """Exibe a página atual"""
         page = self._pages[self.current_page]
@@ -143,6 +305,9 @@ class ScreenManager(object):
 
 
 class Page(pygame_gui.UIManager):
+    # Intervalo, em segundos, em que o servidor envia os dados da página; None se a página não assina nada
+    update_interval = None
+
     def __init__(
         self, 
         name: str, 
@@ -158,27 +323,46 @@ class Page(pygame_gui.UIManager):
         self.data = None
         self.data_lock = threading.Lock()
 
+        self._subscription = None
+
         self._screen_manager.add_page(self)
 
-    def get_new_data(self):
-        """Gerencia quando os dados tem que ser atualizados"""
-        self.get_data_from_socket()
+    def show(self):
+        """Assina os dados da página quando ela passa a ser exibida"""
+        if self.update_interval is not None and self._subscription is None:
+            self._subscription = self._socket_manager.subscribe(
+                self.name, self.set_data, self.update_interval, self.request_parameters()
+            )
 
-    def get_data_from_socket(self):
-        """Pede para enviar uma mensagem ao servidor"""
-        self._socket_manager.update_data(self.name, self.set_data)
+    def hide(self):
+        """Cancela a assinatura quando a página deixa de ser exibida"""
+        if self._subscription is not None:
+            self._socket_manager.unsubscribe(self._subscription)
+            self._subscription = None
+
+    def request_parameters(self):
+        """Parâmetros enviados junto com a assinatura da página"""
+        return {}
 
     def set_data(self, new_data):
         """Formata os dados recebidos do servidor"""
         self.data = new_data
         self.update_screen()
 
+    def load_history(self, key: str, result):
+        """Preenche o histórico local com as médias de uma série guardada no servidor, antes das amostras ao vivo"""
+        _, aggregates = decode_rollup(result)
+        values = aggregates["avg"]
+
+        with self.data_lock:
+            for row in values.T:
+                self.history.append(key, row)
+
     def update_screen(self):
         """Atualiza os dados na tela"""
 
     def render(self):
         """Renderiza um frame"""
-        self.get_new_data()
         time_delta = self._screen_manager.clock.tick(30) / 1000.0
         self.update(time_delta)
         self.draw_ui(self._screen_manager.screen)
@@ -266,10 +450,6 @@ class SystemPage(Page):
             manager=self
         )
 
-    def get_data(self):
-        if self.data is not None:
-            self.get_data_from_socket()
-
     def update_screen(self):
         self.node_label.set_text(f"Nome do sistema: {self.data['name']}")
         self.system_label.set_text(f"Sistema operacional: {self.data['system']}")
@@ -282,26 +462,18 @@ class SystemPage(Page):
 
 
 class CpuPage(Page):
+    update_interval = 2.0
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-        self.data = {
-            "usage": [], 
-            "cores_usage": {}
-        }
-
-        self._initialized = False
+        self.data = {}
+        self.history = TimeSeriesStore(history_depth)
 
-        self.usage_graph_fig = pylab.figure(figsize=[7, 4], dpi=75)
-        self.usage_graph = self.usage_graph_fig.gca()
-
-        self.usage_graph.set_ylim(0, 100)
-        self.usage_graph.set_xlim(1, 10)
-
-        self.usage_graph.yaxis.set_major_formatter(FuncFormatter(lambda y, _: f"{y}%"))
-
-        self.canvas = backend_agg.FigureCanvasAgg(self.usage_graph_fig)
-        self.usage_graph_renderer = self.canvas.get_renderer()
+        self.usage_graph = create_chart(
+            chart_backend,
+            figsize=[7, 4], dpi=75, xlim=(1, graph_points), ylim=(0, 100), y_formatter=lambda y, _: f"{y}%",
+        )
         self.usage_graph_surf = None
 
         self.colors = []
@@ -347,79 +519,41 @@ class CpuPage(Page):
             manager=self,
         )
 
-    def init(self):
-        if not self._initialized:
-            self.get_new_data_loop()
-
-        self._initialized = True
-
-    @run_in_thread
-    def get_new_data_loop(self):
-        while True:
-            self.get_new_data()
-            time.sleep(4)
+    def set_facts(self, facts):
+        """Exibe as informações fixas da CPU, recebidas uma vez por conexão"""
+        self.name_label.set_text(f"Modelo: {facts['name']}")
+        self.architecture_label.set_text(f"Arquitetura: {facts['architecture']}")
+        self.bits_label.set_text(f"Bits: {facts['bits']}")
+        self.min_frequency_label.set_text(f"Frequência mínima: {facts['min_frequency']}hz")
+        self.max_frequency_label.set_text(f"Frequência máxima: {facts['max_frequency']}hz")
+        self.physical_cores_number_label.set_text(f"Núcleos (físicos): {facts['physical_cores_number']}")
+        self.cores_number_label.set_text(f"Núcleos: {facts['cores_number']}")
 
     def set_data(self, new_data):
         with self.data_lock:
-            self.data["usage"].append(new_data["usage"])
-
-            if len(self.data["usage"]) > 10:
-                self.data["usage"] = self.data["usage"][1:]
-
-            for core in range(new_data["cores_number"]):
-                if core not in self.data["cores_usage"].keys():
-                    self.data["cores_usage"][core] = []
-
-                self.data["cores_usage"][core].append(new_data["cores_usage"][core])
-
-                if len(self.data["cores_usage"][core]) > 10:
-                    self.data["cores_usage"][core] = self.data["cores_usage"][core][1:]
+            self.history.append("usage", new_data["usage"])
+            self.history.append("cores_usage", new_data["cores_usage"])
 
-            new_data.pop("usage")
-            new_data.pop("cores_usage")
+            self.data["current_frequency"] = new_data["current_frequency"]
 
-            self.data = {**self.data, **new_data}
-
-            self.name_label.set_text(f"Modelo: {self.data['name']}")
-            self.architecture_label.set_text(f"Arquitetura: {self.data['architecture']}")
-            self.bits_label.set_text(f"Bits: {self.data['bits']}")
-            self.min_frequency_label.set_text(f"Frequência mínima: {self.data['min_frequency']}hz")
-            self.max_frequency_label.set_text(f"Frequência máxima: {self.data['max_frequency']}hz")
             self.current_frequency_label.set_text(f"Frequência atual: {self.data['current_frequency']}hz")
-            self.physical_cores_number_label.set_text(f"Núcleos (físicos): {self.data['physical_cores_number']}")
-            self.cores_number_label.set_text(f"Núcleos: {self.data['cores_number']}")
 
             if not self.colors:
-                self.colors = ["#"+"".join([random.choice("0123456789ABCDEF") for j in range(6)]) for i in range(self.data["cores_number"] + 1)]
+                self.colors = ["#"+"".join([random.choice("0123456789ABCDEF") for j in range(6)]) for i in range(len(new_data["cores_usage"]) + 1)]
 
         self.update_screen()
 
     def update_screen(self):
         with self.data_lock:
-            for line in self.usage_graph.get_lines():
-                line.remove()
-
-            self.usage_graph.plot(
-                range(1, len(self.data["usage"]) + 1),
-                self.data["usage"],
-                self.colors[0], 
-                label=f"Geral ({self.data['usage'][-1]})%")
-
-        count = 1
-        for core in self.data["cores_usage"].values():
-            self.usage_graph.plot(
-                range(1, len(core) + 1), 
-                core, self.colors[count], 
-                label=f"Núcleo {count} ({core[-1]}%)"
-            )
-            count += 1
+            usage = self.history.window("usage", graph_points)[:, 0]
+            cores_usage = self.history.window("cores_usage", graph_points)
 
-        self.canvas.draw()
-        self.usage_graph_raw_data = self.usage_graph_renderer.tostring_rgb()
-        self.usage_graph_size = self.canvas.get_width_height()
-        self.usage_graph_surf = pygame.image.fromstring(self.usage_graph_raw_data, self.usage_graph_size, "RGB")
+            series = [usage] + [cores_usage[:, core] for core in range(cores_usage.shape[1])]
+            labels = [f"Geral ({usage[-1]:.1f})%"] + [
+                f"Núcleo {core + 1} ({cores_usage[-1, core]:.1f}%)" for core in range(cores_usage.shape[1])
+            ]
 
-        self.usage_graph.legend()
+            self.usage_graph_surf = self.usage_graph.render(series, labels, self.colors)
 
     def render(self):
         if self.usage_graph_surf is not None:
@@ -432,24 +566,18 @@ class CpuPage(Page):
 
 
 class RamPage(Page):
+    update_interval = 2.0
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-        self.data = {"percent_usage": []}
-
-        self._initialized = False
-
-        self.usage_graph_fig = pylab.figure(figsize=[7, 4], dpi=75)
-        self.usage_graph = self.usage_graph_fig.gca()
-
-        self.usage_graph.set_ylim(0, 100)
-        self.usage_graph.set_xlim(1, 10)
-
-        self.usage_graph.yaxis.set_major_formatter(FuncFormatter(lambda y, _: f"{y}%"))
-
-        self.canvas = backend_agg.FigureCanvasAgg(self.usage_graph_fig)
-        self.usage_graph_renderer = self.canvas.get_renderer()
+        self.data = {}
+        self.history = TimeSeriesStore(history_depth)
 
+        self.usage_graph = create_chart(
+            chart_backend,
+            figsize=[7, 4], dpi=75, xlim=(1, graph_points), ylim=(0, 100), y_formatter=lambda y, _: f"{y}%",
+        )
         self.usage_graph_surf = None
 
         self.color = "#"+"".join([random.choice("0123456789ABCDEF") for j in range(6)])
@@ -470,52 +598,26 @@ class RamPage(Page):
             manager=self
         )
 
-    def init(self):
-        if not self._initialized:
-            self.get_new_data_loop()
-
-        self._initialized = True
-
-    @run_in_thread
-    def get_new_data_loop(self):
-        while True:
-            self.get_new_data()
-            time.sleep(4)
-
     def set_data(self, new_data):
         with self.data_lock:
-            self.data["percent_usage"].append(new_data["percent_usage"])
-
-            if len(self.data["percent_usage"]) > 10:
-                self.data["percent_usage"] = self.data["percent_usage"][1:]
+            self.history.append("percent_usage", new_data["percent_usage"])
 
-            self.data = {**new_data, **self.data}
+            self.data = new_data
 
         self.update_screen()
 
     def update_screen(self):
         with self.data_lock:
-            for line in self.usage_graph.get_lines():
-                line.remove()
-
-            self.usage_graph.plot(
-                range(1, len(self.data["percent_usage"]) + 1),  
-                self.data["percent_usage"], 
-                self.color, 
-                label=f"Uso ({self.data['percent_usage'][-1]})%"
+            percent_usage = self.history.window("percent_usage", graph_points)[:, 0]
+
+            self.usage_graph_surf = self.usage_graph.render(
+                [percent_usage], [f"Uso ({percent_usage[-1]:.1f})%"], [self.color]
             )
 
             self.total_gb_label.set_text(f"Total: {self.data['total_gb']}gb")
             self.used_gb_label.set_text(f"Usado: {self.data['used_gb']}gb")
             self.available_gb_label.set_text(f"Disponível: {self.data['available_gb']}gb")
 
-        self.canvas.draw()
-        usage_graph_raw_data = self.usage_graph_renderer.tostring_rgb()
-        usage_graph_size = self.canvas.get_width_height()
-        self.usage_graph_surf = pygame.image.fromstring(usage_graph_raw_data, usage_graph_size, "RGB")
-
-        self.usage_graph.legend()
-
     def render(self):
         if self.usage_graph_surf is not None:
             time_delta = self._screen_manager.clock.tick(30) / 1000.0
@@ -527,6 +629,8 @@ class RamPage(Page):
 
 
 class DiskPage(Page):
+    update_interval = 5.0
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -546,10 +650,6 @@ class DiskPage(Page):
             manager=self
         )
 
-    def get_data(self):
-        if self.data is not None:
-            self.get_data_from_socket()
-
     def update_screen(self):
         with self.data_lock:
             self.total_label.set_text(f"Total: {self.data['gize_gb']}gb")
@@ -562,6 +662,8 @@ class DiskPage(Page):
 
 
 class NetworkPage(Page):
+    update_interval = 5.0
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -588,50 +690,56 @@ class NetworkPage(Page):
             manager=self
         )
 
-        self.data_requested = False
-
-    def get_new_data(self):
-        if not self.data_requested:
-            self.get_data_from_socket()
-
-        self.data_requested = True
+        self.interfaces_view = TextView(self.interfaces_text)
+        self.hosts_view = TextView(self.hosts_text)
 
     def update_screen(self):
-        interfaces_text_content = "<b>Interface - Endereço - Netmask</b>"
-
-        for interface in self.data["interfaces"]:
-            interfaces_text_content += f"<br>{interface['interface']} - {interface['address']} - {interface['netmask']}"
+        self.interfaces_view.set_lines(
+            "<b>Interface - Endereço - Netmask</b>",
+            [
+                f"{interface['interface']} - {interface['address']} - {interface['netmask']}"
+                for interface in self.data["interfaces"]
+            ],
+        )
 
-        hosts_text_content = "<b>Host - Nome - Status</b><br>"
+        hosts_parts = ["<b>Host - Nome - Status</b><br>"]
 
         for host in self.data["hosts"]:
-            hosts_text_content += f"<br> {host['host']} - {host['name']} - {host['state']}<br> Protocolos:"
+            hosts_parts.append(f"<br> {host['host']} - {host['name']} - {host['state']}<br> Protocolos:")
 
             for protocol in host['protocols']:
-                hosts_text_content += f"<br>  - {protocol['protocol']}<br>   Portas:<br>"
-
-                for port in protocol['posts']:
-                    hosts_text_content += f"    - {port['port']}: {port['state']}"
+                hosts_parts.append(f"<br>  - {protocol['protocol']}<br>   Portas:<br>")
+                hosts_parts.extend(f"    - {port['port']}: {port['state']}" for port in protocol['ports'])
 
+        self.hosts_view.set_html("".join(hosts_parts))
 
-        self.interfaces_text.html_text = interfaces_text_content
-        self.hosts_text.html_text=hosts_text_content
+    def render(self):
+        self.interfaces_view.refresh()
+        self.hosts_view.refresh()
 
-        self.interfaces_text.rebuild()
-        self.hosts_text.rebuild()
+        super().render()
 
 
 class ProcessesPage(Page):
+    update_interval = 3.0
+
+    columns = [
+        Column("pid", "PID", 60, "d", descending=False),
+        Column("name", "Nome", 170, descending=False),
+        Column("cpu_percent", "CPU (%)", 75, ".1f"),
+        Column("used_memory", "Memória (MB)", 105, ".1f"),
+        Column("used_threads", "Threads", 70, "d"),
+        Column("read_rate", "Leitura (KB/s)", 110, ".1f", scale=1 / 1024),
+        Column("write_rate", "Escrita (KB/s)", 110, ".1f", scale=1 / 1024),
+        Column("ctx_switch_rate", "Trocas/s", 90, ".0f"),
+        Column("cpu_time", "CPU total (s)", 110, ".1f"),
+    ]
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-        self.preload_fonts([{"name": "fira_code", "html_size": 14, "style": "bold"}])
-
-        self.processes_text = pygame_gui.elements.UITextBox(
-            relative_rect=pygame.Rect((0, 0), (900, 470)),
-            html_text="", 
-            manager=self
-        )
+        self.model = TableModel("pid", "cpu_percent", descending=True)
+        self.table_view = TableView(self, pygame.Rect((0, 0), (900, 470)), self.columns, self.model)
 
         self.previous_button = pygame_gui.elements.UIButton(
             relative_rect=pygame.Rect((175, 480), (100, 50)), 
@@ -645,31 +753,49 @@ class ProcessesPage(Page):
             manager=self,
         )
 
-        self.pages = []
-        self.page = 1
-
-    def update_screen(self):
-        self.pages = list(divide_chunks(self.data, 22))
-
-    def render(self):
-        if self.pages:
-            if self.page == 1:
-                self.previous_button.disable()
-            else:
-                self.previous_button.enable()
-            if self.page == len(self.pages) - 1:
-                self.next_button.disable()
-            else:
-                self.next_button.enable()
+        self.sequence = 0
 
-            text = "<b>Nome - Memória usada - Percentagem da memória usada - Threads usados - Tempo em execução - Data de criação</b>"
+    def request_parameters(self):
+        return {"since": self.sequence}
 
-            for process in self.pages[self.page]:
-                text += f"<br>{process['name']} - {process['used_memory']} - {process['memory_use_percent']} - {process['used_threads']} - {process['created_time']} - {process['created_date']}"
+    def set_data(self, new_data):
+        """Aplica a tabela completa ou as diferenças recebidas sobre a tabela local"""
+        if new_data["full"]:
+            self.model.replace(new_data["processes"])
+        elif new_data["base"] == self.sequence:
+            for delta in new_data["deltas"]:
+                self.model.apply(delta["added"], delta["removed"], delta["changed"])
+        else:
+            # A tabela local se perdeu da sequência do servidor: assina de novo para receber a tabela completa
+            self.sequence = 0
+            self.hide()
+            self.show()
+            return
+
+        self.sequence = new_data["sequence"]
+
+    def handle_event(self, event):
+        if event.type == pygame.USEREVENT and event.user_type == pygame_gui.UI_BUTTON_PRESSED:
+            if event.ui_element == self.next_button:
+                self.table_view.page_down()
+                return
+            if event.ui_element == self.previous_button:
+                self.table_view.page_up()
+                return
+
+        self.table_view.handle_event(event)
 
-            self.processes_text.html_text = text
+    def render(self):
+        self.table_view.refresh()
 
-            self.processes_text.rebuild()
+        if self.table_view.offset == 0:
+            self.previous_button.disable()
+        else:
+            self.previous_button.enable()
+        if self.table_view.offset + self.table_view.visible_rows >= self.table_view.total:
+            self.next_button.disable()
+        else:
+            self.next_button.enable()
 
         super().render()
 
@@ -724,13 +850,43 @@ def set_server_port(value):
         port = 0
 
 
+def set_host_facts(facts):
+    """Distribui as informações fixas da máquina, pedidas uma vez por conexão"""
+    system_page.set_data(facts["system"])
+    cpu_page.set_facts(facts["cpu"])
+
+
 def main():
     """Loop principal da interface"""
     socket_manager.connect(host, port)
+    # Informações fixas, o histórico guardado no servidor e a primeira amostra das páginas de resumo
+    # em uma única ida e volta; as funções rodam na ordem do lote, então o histórico entra antes da amostra
+    history_requests = [
+        (cpu_page, "usage", "cpu.usage"),
+        (cpu_page, "cores_usage", "cpu.cores_usage"),
+        (ram_page, "percent_usage", "ram.percent_usage"),
+    ]
+
+    socket_manager.update_batch(
+        [{"data": "facts"}]
+        + [
+            {
+                "data": "history",
+                "series": series,
+                "start": -history_depth * page.update_interval,
+                "points": history_depth,
+            }
+            for page, _, series in history_requests
+        ]
+        + [{"data": "cpu"}, {"data": "ram"}, {"data": "disk"}],
+        [set_host_facts]
+        + [partial(page.load_history, key) for page, key, _ in history_requests]
+        + [cpu_page.set_data, ram_page.set_data, disk_page.set_data],
+    )
 
     clock = screen_manager.clock
 
-    screen_manager.current_page = "system"
+    screen_manager.set_current_page("system")
 
     running = True
 
@@ -746,27 +902,24 @@ def main():
             if event.type == pygame.USEREVENT:
                 if event.user_type == pygame_gui.UI_BUTTON_PRESSED:
                     if event.ui_element == btn_system:
-                        screen_manager.current_page = "system"
+                        screen_manager.set_current_page("system")
                     if event.ui_element == btn_cpu:
-                        cpu_page.init()
-                        screen_manager.current_page = "cpu"
+                        screen_manager.set_current_page("cpu")
                     if event.ui_element == btn_memory:
-                        ram_page.init()
-                        screen_manager.current_page = "ram"
+                        screen_manager.set_current_page("ram")
                     if event.ui_element == btn_disk:
-                        screen_manager.current_page = "disk"
+                        screen_manager.set_current_page("disk")
                     if event.ui_element == btn_network:
-                        screen_manager.current_page = "network"
+                        screen_manager.set_current_page("network")
                     if event.ui_element == btn_processes:
-                        screen_manager.current_page = "processes"
-                    if event.ui_element == processes_page.next_button:
-                        processes_page.page += 1
-                    if event.ui_element == processes_page.previous_button:
-                        processes_page.page -= 1
+                        screen_manager.set_current_page("processes")
 
             main_manager.process_events(event)
             processes_page.process_events(event)
 
+            if screen_manager.current_page == "processes":
+                processes_page.handle_event(event)
+
         main_manager.update(time_delta)
 
         screen_manager.screen.fill((255, 255, 255))
@@ -0,0 +1,544 @@
+import array
+import itertools
+import pickle
+import struct
+import sys
+
+CODEC_PICKLE = 0
+CODEC_COMPACT = 1
+
+
+class CodecError(ValueError):
+    """Erro ao serializar ou desserializar o corpo de uma mensagem"""
+
+
+class PickleCodec(object):
+    """Formato antigo, mantido apenas para compatibilidade; nunca deve ser aceito de clientes não confiáveis"""
+
+    codec_id = CODEC_PICKLE
+    name = "pickle"
+
+    def encode(self, payload, schema: str = None) -> bytes:
+        return pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def decode(self, body):
+        try:
+            return pickle.loads(body)
+        except Exception as error:
+            raise CodecError(f"Corpo inválido: {error!r}") from error
+
+
+# Marcadores do formato genérico do CompactCodec
+TAG_NONE = 0
+TAG_FALSE = 1
+TAG_TRUE = 2
+TAG_INT8 = 3
+TAG_INT32 = 4
+TAG_INT64 = 5
+TAG_FLOAT = 6
+TAG_STR = 7
+TAG_STR_REF = 8
+TAG_BYTES = 9
+TAG_LIST = 10
+TAG_DICT = 11
+# Versões curtas, com tamanho ou índice em um byte
+TAG_STR8 = 12
+TAG_STR_REF8 = 13
+TAG_LIST8 = 14
+TAG_DICT8 = 15
+# Lista de registros com os campos de um esquema de tabela, e dicionário chave inteira -> registro parcial dele
+TAG_TABLE = 16
+TAG_CHANGES = 17
+
+U32 = struct.Struct("<I")
+I8 = struct.Struct("<b")
+I32 = struct.Struct("<i")
+I64 = struct.Struct("<q")
+F64 = struct.Struct("<d")
+
+
+class _Writer(object):
+    """Serializa valores genéricos; textos repetidos são enviados uma vez e depois referenciados"""
+
+    def __init__(self, out: bytearray):
+        self.out = out
+        self.strings = {}
+
+    def write_str(self, value: str):
+        index = self.strings.get(value)
+
+        if index is not None:
+            if index < 256:
+                self.out += bytes((TAG_STR_REF8, index))
+            else:
+                self.out.append(TAG_STR_REF)
+                self.out += U32.pack(index)
+            return
+
+        self.strings[value] = len(self.strings)
+        encoded = value.encode("utf-8")
+
+        if len(encoded) < 256:
+            self.out += bytes((TAG_STR8, len(encoded)))
+        else:
+            self.out.append(TAG_STR)
+            self.out += U32.pack(len(encoded))
+
+        self.out += encoded
+
+    def write(self, value):
+        out = self.out
+
+        if value is None:
+            out.append(TAG_NONE)
+        elif value is True:
+            out.append(TAG_TRUE)
+        elif value is False:
+            out.append(TAG_FALSE)
+        elif isinstance(value, str):
+            self.write_str(value)
+        elif isinstance(value, float):
+            out.append(TAG_FLOAT)
+            out += F64.pack(value)
+        elif isinstance(value, int):
+            if -128 <= value < 128:
+                out.append(TAG_INT8)
+                out += I8.pack(value)
+            elif -2 ** 31 <= value < 2 ** 31:
+                out.append(TAG_INT32)
+                out += I32.pack(value)
+            elif -2 ** 63 <= value < 2 ** 63:
+                out.append(TAG_INT64)
+                out += I64.pack(value)
+            else:
+                raise CodecError(f"Inteiro fora do intervalo suportado: {value}")
+        elif isinstance(value, dict):
+            if value and self._write_changes(value):
+                return
+
+            if len(value) < 256:
+                out += bytes((TAG_DICT8, len(value)))
+            else:
+                out.append(TAG_DICT)
+                out += U32.pack(len(value))
+
+            for key, item in value.items():
+                self.write(key)
+                self.write(item)
+        elif isinstance(value, (list, tuple)):
+            if value and type(value[0]) is dict and self._write_table(value):
+                return
+
+            if len(value) < 256:
+                out += bytes((TAG_LIST8, len(value)))
+            else:
+                out.append(TAG_LIST)
+                out += U32.pack(len(value))
+
+            for item in value:
+                self.write(item)
+        elif isinstance(value, (bytes, bytearray, memoryview)):
+            out.append(TAG_BYTES)
+            out += U32.pack(len(value))
+            out += value
+        else:
+            raise CodecError(f"Tipo não suportado: {type(value).__name__}")
+
+    def _write_table(self, records) -> bool:
+        """Grava a lista por colunas se os registros têm os campos de um esquema; retorna False se não couber"""
+        schema = table_schemas.get(frozenset(records[0]))
+
+        if schema is None:
+            return False
+
+        start = len(self.out)
+        self.out += bytes((TAG_TABLE, schema.schema_id))
+
+        try:
+            schema.pack(self.out, records)
+        except packing_errors:
+            del self.out[start:]
+            return False
+
+        return True
+
+    def _write_changes(self, changes: dict) -> bool:
+        """Como _write_table, para dicionários pid -> campos que mudaram, como nas diferenças da tabela"""
+        key, first = next(iter(changes.items()))
+
+        if type(key) is not int or type(first) is not dict:
+            return False
+
+        fields = first.keys()
+        schema = next((schema for names, schema in table_schemas.items() if fields <= names), None)
+
+        if schema is None:
+            return False
+
+        start = len(self.out)
+        self.out += bytes((TAG_CHANGES, schema.schema_id))
+
+        try:
+            schema.pack_changes(self.out, changes)
+        except packing_errors:
+            del self.out[start:]
+            return False
+
+        return True
+
+
+class _Reader(object):
+    def __init__(self, view: memoryview, offset: int):
+        self.view = view
+        self.offset = offset
+        self.strings = []
+
+    def read(self):
+        view = self.view
+        tag = view[self.offset]
+        self.offset += 1
+
+        if tag == TAG_NONE:
+            return None
+        if tag == TAG_TRUE:
+            return True
+        if tag == TAG_FALSE:
+            return False
+        if tag == TAG_STR_REF8:
+            index = view[self.offset]
+            self.offset += 1
+            return self.strings[index]
+        if tag == TAG_STR8 or tag == TAG_STR:
+            if tag == TAG_STR8:
+                length = view[self.offset]
+                start = self.offset + 1
+            else:
+                length = U32.unpack_from(view, self.offset)[0]
+                start = self.offset + U32.size
+
+            self.offset = start + length
+            value = str(view[start:self.offset], "utf-8")
+            self.strings.append(value)
+            return value
+        if tag == TAG_STR_REF:
+            index = U32.unpack_from(view, self.offset)[0]
+            self.offset += U32.size
+            return self.strings[index]
+        if tag == TAG_FLOAT:
+            value = F64.unpack_from(view, self.offset)[0]
+            self.offset += F64.size
+            return value
+        if tag == TAG_INT8:
+            value = I8.unpack_from(view, self.offset)[0]
+            self.offset += I8.size
+            return value
+        if tag == TAG_INT32:
+            value = I32.unpack_from(view, self.offset)[0]
+            self.offset += I32.size
+            return value
+        if tag == TAG_INT64:
+            value = I64.unpack_from(view, self.offset)[0]
+            self.offset += I64.size
+            return value
+        if tag == TAG_DICT8 or tag == TAG_DICT:
+            if tag == TAG_DICT8:
+                count = view[self.offset]
+                self.offset += 1
+            else:
+                count = U32.unpack_from(view, self.offset)[0]
+                self.offset += U32.size
+
+            result = {}
+
+            for _ in range(count):
+                key = self.read()
+                result[key] = self.read()
+
+            return result
+        if tag == TAG_LIST8 or tag == TAG_LIST:
+            if tag == TAG_LIST8:
+                count = view[self.offset]
+                self.offset += 1
+            else:
+                count = U32.unpack_from(view, self.offset)[0]
+                self.offset += U32.size
+
+            return [self.read() for _ in range(count)]
+        if tag == TAG_TABLE:
+            records, self.offset = schemas_by_id[view[self.offset]].unpack(view, self.offset + 1)
+            return records
+        if tag == TAG_CHANGES:
+            changes, self.offset = schemas_by_id[view[self.offset]].unpack_changes(view, self.offset + 1)
+            return changes
+        if tag == TAG_BYTES:
+            length = U32.unpack_from(view, self.offset)[0]
+            start = self.offset + U32.size
+            self.offset = start + length
+            return bytes(view[start:self.offset])
+
+        raise CodecError(f"Marcador desconhecido: {tag}")
+
+
+# Tipos numéricos dos esquemas: código do array e, nos percentuais, a escala usada no envio
+numeric_kinds = {
+    "f64": ("d", None),
+    "u32": ("I", None),
+    "u64": ("Q", None),
+    "i64": ("q", None),
+    # Percentuais com uma casa decimal, enviados em décimos
+    "percent": ("H", 10),
+}
+
+
+# Erros de um registro que não cabe no esquema; nesse caso o valor é gravado no formato genérico
+packing_errors = (KeyError, TypeError, ValueError, AttributeError, OverflowError, struct.error)
+
+
+def _write_array(out: bytearray, values: array.array):
+    if sys.byteorder == "big":
+        values.byteswap()
+
+    out += U32.pack(len(values))
+    out += values.tobytes()
+
+
+def _read_array(view: memoryview, offset: int, typecode: str):
+    count = U32.unpack_from(view, offset)[0]
+    offset += U32.size
+
+    values = array.array(typecode)
+    end = offset + count * values.itemsize
+    values.frombytes(view[offset:end])
+
+    if sys.byteorder == "big":
+        values.byteswap()
+
+    return values, end
+
+
+def _pack_strings(out: bytearray, values: list):
+    """Grava os tamanhos em caracteres e um único bloco de texto, decodificado de uma vez na leitura"""
+    _write_array(out, array.array("I", [len(value) for value in values]))
+    encoded = "".join(values).encode("utf-8")
+    out += U32.pack(len(encoded))
+    out += encoded
+
+
+def _unpack_strings(view: memoryview, offset: int):
+    lengths, offset = _read_array(view, offset, "I")
+    size = U32.unpack_from(view, offset)[0]
+    offset += U32.size
+    text = str(view[offset:offset + size], "utf-8")
+    ends = itertools.accumulate(lengths)
+
+    return [text[end - length:end] for end, length in zip(ends, lengths)], offset + size
+
+
+def _pack_column(out: bytearray, kind: str, column: list):
+    if kind in numeric_kinds:
+        typecode, scale = numeric_kinds[kind]
+
+        if scale is not None:
+            column = [round(value * scale) for value in column]
+
+        _write_array(out, array.array(typecode, column))
+    elif kind == "str":
+        _pack_strings(out, column)
+    elif kind == "sym":
+        # Textos que se repetem muito: lista de valores distintos e o índice de cada registro
+        symbols = {}
+        indexes = array.array("I", [symbols.setdefault(value, len(symbols)) for value in column])
+        _write_array(out, indexes)
+        _pack_strings(out, list(symbols))
+    elif kind == "percent[]":
+        _write_array(out, array.array("I", [len(value) for value in column]))
+        _write_array(out, array.array("H", [round(value * 10) for values in column for value in values]))
+
+
+def _unpack_column(view: memoryview, offset: int, kind: str):
+    if kind in numeric_kinds:
+        typecode, scale = numeric_kinds[kind]
+        values, offset = _read_array(view, offset, typecode)
+
+        return ([value / scale for value in values] if scale is not None else values.tolist()), offset
+    if kind == "str":
+        return _unpack_strings(view, offset)
+    if kind == "sym":
+        indexes, offset = _read_array(view, offset, "I")
+        symbols, offset = _unpack_strings(view, offset)
+
+        return [symbols[index] for index in indexes], offset
+
+    # percent[]
+    lengths, offset = _read_array(view, offset, "I")
+    values, offset = _read_array(view, offset, "H")
+    values = [value / 10 for value in values]
+    ends = list(itertools.accumulate(lengths))
+
+    return [values[end - length:end] for end, length in zip(ends, lengths)], offset
+
+
+class Schema(object):
+    """Formato binário fixo de uma métrica, gravado por colunas: cada campo vira um array ou um bloco de texto"""
+
+    def __init__(self, schema_id: int, fields: list, many: bool = False):
+        self.schema_id = schema_id
+        self.fields = fields
+        self.names = [name for name, _ in fields]
+        self.many = many
+
+    def pack(self, out: bytearray, payload):
+        records = payload if self.many else [payload]
+        width = len(self.fields)
+
+        # Com o mesmo tamanho e sem KeyError abaixo, cada registro tem exatamente os campos do esquema
+        if any(len(record) != width for record in records):
+            raise CodecError("Registro não corresponde ao esquema")
+
+        out += U32.pack(len(records))
+
+        for name, kind in self.fields:
+            _pack_column(out, kind, [record[name] for record in records])
+
+    def pack_changes(self, out: bytearray, changes: dict):
+        """Grava um dicionário chave inteira -> registro parcial: para cada campo, as posições que o têm e os valores.
+
+        As chaves são pids, gravados como u32; um campo presente em todos os registros não grava as posições."""
+        positions = {name: [] for name in self.names}
+        columns = {name: [] for name in self.names}
+
+        for index, record in enumerate(changes.values()):
+            for name, value in record.items():
+                positions[name].append(index)
+                columns[name].append(value)
+
+        _write_array(out, array.array("I", changes))
+
+        for name, kind in self.fields:
+            present = positions[name]
+            _write_array(out, array.array("I", present if len(present) != len(changes) else ()))
+            _pack_column(out, kind, columns[name])
+
+    def unpack(self, view: memoryview, offset: int):
+        """Retorna os registros e a posição seguinte do corpo"""
+        count = U32.unpack_from(view, offset)[0]
+        offset += U32.size
+        columns = []
+
+        for _, kind in self.fields:
+            column, offset = _unpack_column(view, offset, kind)
+            columns.append(column)
+
+        if any(len(column) != count for column in columns):
+            raise CodecError("Quantidade de registros não corresponde ao cabeçalho")
+
+        names = self.names
+        records = [dict(zip(names, row)) for row in zip(*columns)]
+
+        return (records if self.many else records[0]), offset
+
+    def unpack_changes(self, view: memoryview, offset: int):
+        keys, offset = _read_array(view, offset, "I")
+        records = [{} for _ in keys]
+
+        for name, kind in self.fields:
+            positions, offset = _read_array(view, offset, "I")
+            column, offset = _unpack_column(view, offset, kind)
+
+            if not positions and len(column) == len(keys):
+                positions = range(len(keys))
+            elif len(column) != len(positions):
+                raise CodecError("Quantidade de valores não corresponde às posições")
+
+            for index, value in zip(positions, column):
+                records[index][name] = value
+
+        return dict(zip(keys.tolist(), records)), offset
+
+
+# Esquemas das métricas mais frequentes; o id 0 indica o formato genérico
+schemas = {
+    "cpu": Schema(1, [
+        ("current_frequency", "f64"),
+        ("usage", "percent"),
+        ("cores_usage", "percent[]"),
+    ]),
+    "ram": Schema(2, [
+        ("total_gb", "f64"),
+        ("used_gb", "f64"),
+        ("available_gb", "f64"),
+        ("percent_usage", "percent"),
+        ("percent_available", "percent"),
+        ("total_bytes", "u64"),
+        ("used_bytes", "u64"),
+        ("available_bytes", "u64"),
+    ]),
+    "disk": Schema(3, [
+        ("gize_gb", "f64"),
+        ("used_gb", "f64"),
+        ("available_gb", "f64"),
+        ("used_percent", "percent"),
+        ("available_percent", "percent"),
+        ("total_bytes", "u64"),
+        ("used_bytes", "u64"),
+        ("available_bytes", "u64"),
+    ]),
+    "processes": Schema(4, [
+        ("pid", "u32"),
+        ("name", "sym"),
+        ("created_date", "sym"),
+        ("used_memory", "f64"),
+        ("memory_use_percent", "f64"),
+        ("used_threads", "u32"),
+        ("cpu_time", "f64"),
+        ("cpu_percent", "f64"),
+        ("read_rate", "f64"),
+        ("write_rate", "f64"),
+        ("ctx_switch_rate", "f64"),
+    ], many=True),
+}
+
+schemas_by_id = {schema.schema_id: schema for schema in schemas.values()}
+# Esquemas de tabelas, usados também dentro do formato genérico (ex.: nas diferenças e consultas de processos)
+table_schemas = {frozenset(schema.names): schema for schema in schemas.values() if schema.many}
+
+
+class CompactCodec(object):
+    """Formato binário próprio: esquemas fixos para as métricas conhecidas e um formato genérico seguro para o resto"""
+
+    codec_id = CODEC_COMPACT
+    name = "compact"
+
+    def encode(self, payload, schema: str = None) -> bytes:
+        out = bytearray()
+        record_schema = schemas.get(schema)
+
+        if record_schema is not None:
+            out.append(record_schema.schema_id)
+
+            try:
+                record_schema.pack(out, payload)
+
+                return bytes(out)
+            except packing_errors:
+                del out[:]
+
+        out.append(0)
+        _Writer(out).write(payload)
+
+        return bytes(out)
+
+    def decode(self, body):
+        view = memoryview(body)
+
+        try:
+            if view[0] == 0:
+                return _Reader(view, 1).read()
+
+            return schemas_by_id[view[0]].unpack(view, 1)[0]
+        except (IndexError, KeyError, ValueError, TypeError, RecursionError, struct.error) as error:
+            # TypeError: chave não hashable em um dicionário; RecursionError: listas aninhadas demais
+            raise CodecError(f"Corpo inválido: {error!r}") from error
+
+
+codecs = {codec.codec_id: codec for codec in (PickleCodec(), CompactCodec())}
@@ -0,0 +1,470 @@
+import argparse
+import asyncio
+import itertools
+import random
+import sys
+import time
+
+from PB_codec import CODEC_COMPACT, CodecError
+from PB_network import parse_ports
+from PB_processes import TableQuery
+from PB_protocol import (
+    FrameReader,
+    MESSAGE_ERROR,
+    MESSAGE_PUSH,
+    MESSAGE_REQUEST,
+    MESSAGE_SUBSCRIBE,
+    ProtocolError,
+    ServerError,
+    decode_batch,
+    encode_message,
+    encode_payload,
+)
+from PB_sampler import Sampler
+from PB_server import MonitoringServer, RequestError
+
+# Métricas assinadas em cada agente, recebidas juntas em um único lote
+agent_metrics = ("cpu", "ram")
+
+fleet_states = ("up", "stale", "connecting", "down")
+fleet_sort_fields = ["address", "name", "cpu", "ram", "ram_used_gb", "cores", "age", "latency_ms"]
+
+
+def parse_agents(specs: list) -> list:
+    """Converte endereços como "host:5700" ou "host:5700-5799" em uma lista de "host:porta" """
+    addresses = []
+
+    for spec in specs:
+        host, separator, ports = spec.strip().rpartition(":")
+
+        if not separator or not host:
+            raise ValueError(f"Endereço de agente inválido: {spec}")
+
+        addresses.extend(f"{host}:{port}" for port in parse_ports(ports))
+
+    return list(dict.fromkeys(addresses))
+
+
+class AgentProtocol(asyncio.BufferedProtocol):
+    """Recebe as respostas e os envios de um agente e os entrega ao Agent"""
+
+    def __init__(self, agent):
+        self._agent = agent
+        self._frame_reader = FrameReader(allowed_codecs=(CODEC_COMPACT,))
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def connection_lost(self, exc):
+        self._agent.connection_lost(self, exc)
+
+    def get_buffer(self, sizehint):
+        return self._frame_reader.get_buffer()
+
+    def buffer_updated(self, nbytes):
+        self._frame_reader.buffer_updated(nbytes)
+
+        try:
+            for message_type, request_id, payload, _ in self._frame_reader.messages():
+                self._agent.handle_message(message_type, request_id, payload)
+        except (ProtocolError, CodecError, TypeError, KeyError) as error:
+            # A conexão é fechada e run() reconecta
+            print(f"Mensagem inválida do agente {self._agent.address}: {error!r}")
+            self.transport.abort()
+
+
+class Agent(object):
+    """Conexão persistente com um PB_server, que mantém a última amostra de cada métrica assinada"""
+
+    def __init__(self, address: str, interval: float = 2.0, timeout: float = 3.0):
+        host, _, port = address.rpartition(":")
+
+        self.address = address
+        self.host = host
+        self.port = int(port)
+        self.interval = interval
+        self.timeout = timeout
+
+        self.connected = False
+        self.data = {}
+        # Horários (monotônicos) da conexão atual e do último envio recebido por ela
+        self.connected_at = None
+        self.updated_at = None
+        self.failures = 0
+        self.last_error = None
+        # Tempo de ida e volta da última requisição, em segundos
+        self.latency = None
+
+        self._protocol = None
+        self._closed = None
+        self._pending = {}
+        self._request_ids = itertools.count(1)
+
+    def state(self, stale_after: float) -> str:
+        """"up" com dados recentes, "stale" conectado mas sem dados novos, "connecting" ou "down" """
+        if not self.connected:
+            return "down" if self.failures else "connecting"
+
+        if self.updated_at is None:
+            # Conectado, ainda esperando o primeiro envio desta conexão
+            return "connecting" if time.monotonic() - self.connected_at <= stale_after else "stale"
+
+        if time.monotonic() - self.updated_at > stale_after:
+            return "stale"
+
+        return "up"
+
+    async def run(self, connect_slots: asyncio.Semaphore, max_backoff: float):
+        """Mantém a conexão aberta, reconectando com espera exponencial quando o agente cai"""
+        loop = asyncio.get_running_loop()
+
+        while True:
+            try:
+                # Limita quantas conexões são abertas ao mesmo tempo, para não sobrecarregar a rede na partida
+                async with connect_slots:
+                    _, protocol = await asyncio.wait_for(
+                        loop.create_connection(lambda: AgentProtocol(self), self.host, self.port), self.timeout
+                    )
+
+                self._protocol = protocol
+                self._closed = loop.create_future()
+                # Os dados da conexão anterior continuam visíveis, mas o agente só volta a "up" com um envio novo
+                self.connected_at = time.monotonic()
+                self.updated_at = None
+                self.connected = True
+
+                await self._start()
+                self.failures = 0
+                await self._closed
+            except (OSError, asyncio.TimeoutError, ServerError) as error:
+                self.last_error = str(error) or type(error).__name__
+            except Exception as error:
+                # Um erro inesperado não pode encerrar a tarefa: o agente é tentado de novo depois da espera
+                print(f"Erro na conexão com o agente {self.address}: {error!r}")
+                self.last_error = repr(error)
+            finally:
+                self.disconnect()
+
+            self.failures += 1
+            # Espera com variação aleatória, para que os agentes que caíram juntos não reconectem juntos
+            backoff = min(max_backoff, self.interval * 2 ** min(self.failures - 1, 16))
+            await asyncio.sleep(backoff * random.uniform(0.5, 1.0))
+
+    async def _start(self):
+        self.data["facts"] = await self.request({"data": "facts"})
+
+        self._send(MESSAGE_SUBSCRIBE, next(self._request_ids), {
+            "data": "batch",
+            "requests": [{"data": name} for name in agent_metrics],
+            "interval": self.interval,
+        })
+
+    def disconnect(self):
+        """Fecha a conexão atual; run() reconecta em seguida"""
+        self.connected = False
+
+        if self._protocol is not None:
+            self._protocol.transport.abort()
+            self._protocol = None
+
+    def _send(self, message_type: int, request_id: int, payload):
+        if self._protocol is None or self._protocol.transport.is_closing():
+            raise ConnectionError(f"Agente {self.address} desconectado")
+
+        self._protocol.transport.write(encode_message(message_type, request_id, payload))
+
+    async def request(self, request: dict):
+        """Envia uma requisição pela conexão compartilhada e espera a resposta, no máximo timeout segundos"""
+        request_id = next(self._request_ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        started = time.monotonic()
+
+        try:
+            self._send(MESSAGE_REQUEST, request_id, request)
+            result = await asyncio.wait_for(future, self.timeout)
+        finally:
+            self._pending.pop(request_id, None)
+
+        self.latency = time.monotonic() - started
+
+        return result
+
+    def handle_message(self, message_type: int, request_id: int, payload):
+        if message_type == MESSAGE_PUSH:
+            results = decode_batch(payload) if isinstance(payload, list) else []
+
+            for name, result in zip(agent_metrics, results):
+                if not isinstance(result, ServerError):
+                    self.data[name] = result
+
+            self.updated_at = time.monotonic()
+            return
+
+        future = self._pending.get(request_id)
+
+        if future is None or future.done():
+            return
+
+        if message_type == MESSAGE_ERROR:
+            future.set_exception(ServerError(payload))
+        else:
+            future.set_result(payload)
+
+    def connection_lost(self, protocol: AgentProtocol, exc):
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError(f"Conexão com o agente {self.address} encerrada"))
+
+        if protocol is self._protocol or self._protocol is None:
+            self.connected = False
+
+            if self._closed is not None and not self._closed.done():
+                self._closed.set_result(None)
+
+    def row(self, stale_after: float, now: float) -> dict:
+        """Linha do agente na visão da frota"""
+        cpu = self.data.get("cpu") or {}
+        ram = self.data.get("ram") or {}
+        facts = self.data.get("facts") or {}
+
+        return {
+            "address": self.address,
+            "name": facts.get("system", {}).get("name", ""),
+            "state": self.state(stale_after),
+            "cpu": cpu.get("usage"),
+            "ram": ram.get("percent_usage"),
+            "ram_used_gb": ram.get("used_gb"),
+            "cores": len(cpu.get("cores_usage") or ()),
+            "age": None if self.updated_at is None else round(now - self.updated_at, 2),
+            "latency_ms": None if self.latency is None else round(self.latency * 1000, 2),
+            "failures": self.failures,
+            "error": self.last_error if not self.connected else None,
+        }
+
+
+class FleetCollector(object):
+    """Mantém uma conexão com cada agente e junta as últimas amostras de todos em uma visão da frota"""
+
+    def __init__(
+        self,
+        addresses: list,
+        interval: float = 2.0,
+        timeout: float = 3.0,
+        max_connecting: int = 64,
+        max_backoff: float = 60.0,
+    ):
+        self.agents = {address: Agent(address, interval, timeout) for address in addresses}
+        self.interval = interval
+        self.max_connecting = max_connecting
+        self.max_backoff = max_backoff
+        # Sem amostra nova nesse tempo o agente aparece como "stale"; no dobro dele a conexão é refeita
+        self.stale_after = 3 * interval
+
+        self._tasks = []
+
+    def start(self):
+        """Inicia a conexão com todos os agentes; deve ser chamado dentro do loop do asyncio"""
+        loop = asyncio.get_running_loop()
+        connect_slots = asyncio.Semaphore(self.max_connecting)
+
+        self._tasks = [loop.create_task(agent.run(connect_slots, self.max_backoff)) for agent in self.agents.values()]
+        self._tasks.append(loop.create_task(self._watch()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+        for agent in self.agents.values():
+            agent.disconnect()
+
+    async def _watch(self):
+        """Derruba as conexões de agentes que pararam de responder, para que sejam refeitas"""
+        while True:
+            await asyncio.sleep(self.interval)
+
+            limit = time.monotonic() - 2 * self.stale_after
+
+            for agent in self.agents.values():
+                # Sem nenhum envio nesta conexão, o prazo conta a partir da conexão
+                last_seen = agent.updated_at if agent.updated_at is not None else agent.connected_at
+
+                if agent.connected and last_seen < limit:
+                    agent.last_error = "Sem dados novos"
+                    agent.disconnect()
+
+    def fleet(self) -> dict:
+        """Visão da frota: uma linha por agente, a quantidade em cada estado e as médias dos agentes ativos"""
+        now = time.monotonic()
+        rows = [agent.row(self.stale_after, now) for agent in self.agents.values()]
+        states = dict.fromkeys(fleet_states, 0)
+
+        for row in rows:
+            states[row["state"]] += 1
+
+        up = [row for row in rows if row["state"] == "up"]
+
+        def average(field):
+            values = [row[field] for row in up if row[field] is not None]
+            return round(sum(values) / len(values), 2) if values else None
+
+        return {"hosts": rows, "states": states, "cpu_average": average("cpu"), "ram_average": average("ram")}
+
+    async def forward(self, address: str, request: dict):
+        """Repassa uma requisição a um agente pela conexão já aberta com ele"""
+        agent = self.agents.get(address)
+
+        if agent is None:
+            raise RequestError(f"Agente desconhecido: {address}")
+
+        if not agent.connected:
+            raise RequestError(f"Agente {address} indisponível: {agent.last_error}")
+
+        try:
+            return await agent.request(request)
+        except asyncio.TimeoutError:
+            raise RequestError(f"O agente {address} não respondeu em {agent.timeout:g}s") from None
+        except (ConnectionError, ServerError) as error:
+            raise RequestError(f"Falha no agente {address}: {error}") from error
+
+
+class FleetQuery(TableQuery):
+    """Consulta à visão da frota: estados aceitos, ordenação e limite (ex.: os 10 hosts com mais uso de CPU)"""
+
+    sort_fields = fleet_sort_fields
+    tie_field = "address"
+
+    def __init__(self, sort: str = "cpu", descending: bool = True, limit: int = None, states: list = ("up",)):
+        super().__init__(sort, descending, limit)
+
+        if states is not None and (not isinstance(states, (list, tuple)) or not set(states) <= set(fleet_states)):
+            raise ValueError(f"Estados inválidos: {states}")
+
+        self.states = None if states is None else tuple(states)
+
+    def run(self, fleet: dict) -> dict:
+        """Filtra e ordena os hosts; com limite, só os primeiros limit são ordenados"""
+        rows = fleet["hosts"]
+
+        if self.states is not None:
+            rows = [row for row in rows if row["state"] in self.states]
+
+        # Hosts sem o valor ainda (recém-conectados) ficam de fora; o endereço desempata
+        rows = [row for row in rows if row[self.sort] is not None]
+
+        return {"total": len(rows), "states": fleet["states"], "hosts": self.select(rows)}
+
+
+class CollectorServer(MonitoringServer):
+    """Atende os clientes como um PB_server, com a visão da frota e repasse de requisições aos agentes"""
+
+    def __init__(self, host: str, port: int, collector: FleetCollector, workers: int = 4):
+        super().__init__(host, port, Sampler({"fleet": collector.fleet}, {"fleet": 1.0}), workers=workers)
+
+        self.collector = collector
+        self._forwarded = itertools.count(1)
+
+    def _build_body(self, request, codec: int):
+        if "agent" in request:
+            # Só chega aqui como item de um lote; o repasse é feito por _respond, fora das threads de resposta
+            raise RequestError("Requisições repassadas a agentes não podem fazer parte de um lote")
+
+        if request.get("data") == "fleet" and "query" in request:
+            try:
+                query = FleetQuery.from_request(request["query"])
+            except ValueError as error:
+                raise RequestError(f"Consulta inválida: {error}") from error
+
+            snapshot = self.sampler.get("fleet")
+
+            return snapshot.version, encode_payload(query.run(snapshot.data), codec)
+
+        return super()._build_body(request, codec)
+
+    async def _respond(self, message_type: int, request_id: int, request, codec: int):
+        """Requisições com "agent" são repassadas ao agente sem ocupar as threads de resposta"""
+        if isinstance(request, dict) and "agent" in request:
+            forwarded = {key: value for key, value in request.items() if key != "agent"}
+
+            try:
+                result = await self.collector.forward(request["agent"], forwarded)
+            except RequestError as error:
+                return None, encode_message(MESSAGE_ERROR, request_id, str(error), codec)
+
+            if "since" in forwarded and isinstance(result, dict) and "sequence" in result:
+                # Processos e alertas: como no servidor, o próximo envio da assinatura parte da sequência recebida,
+                # e só há envio novo quando a sequência do agente muda
+                request["since"] = result["sequence"]
+                version = ("since", result["sequence"])
+            else:
+                # Cada resposta repassada é uma versão nova, então as assinaturas viram consultas periódicas ao agente
+                version = next(self._forwarded)
+
+            return version, encode_message(message_type, request_id, result, codec, forwarded.get("data"))
+
+        return await super()._respond(message_type, request_id, request, codec)
+
+    def _serves(self, request) -> bool:
+        # O agente pode estar só temporariamente fora, então a assinatura repassada continua
+        return "agent" in request or super()._serves(request)
+
+    async def serve(self):
+        self.collector.start()
+
+        try:
+            await super().serve()
+        finally:
+            await self.collector.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Coletor que junta vários servidores de monitoramento")
+    parser.add_argument("--host", default="0.0.0.0", help="endereço em que o coletor escuta")
+    parser.add_argument("--port", type=int, required=True, help="porta do coletor")
+    parser.add_argument(
+        "--agent",
+        action="append",
+        default=[],
+        metavar="HOST:PORTAS",
+        help="agente monitorado, ex.: 10.0.0.5:5000 ou 127.0.0.1:5700-5899 (pode ser repetido)",
+    )
+    parser.add_argument("--agents-file", help="arquivo com um agente por linha, no mesmo formato de --agent")
+    parser.add_argument("--interval", type=float, default=2.0, help="segundos entre as amostras de cada agente")
+    parser.add_argument("--timeout", type=float, default=3.0, help="segundos de espera por um agente")
+    parser.add_argument("--max-connecting", type=int, default=64, help="conexões com agentes abertas ao mesmo tempo")
+    parser.add_argument("--workers", type=int, default=4, help="threads usadas para responder as requisições")
+    args = parser.parse_args()
+
+    specs = list(args.agent)
+
+    if args.agents_file:
+        with open(args.agents_file, encoding="utf-8") as agents_file:
+            specs.extend(line for line in agents_file if line.strip() and not line.startswith("#"))
+
+    try:
+        addresses = parse_agents(specs)
+    except ValueError as error:
+        parser.error(str(error))
+
+    if not addresses:
+        parser.error("informe ao menos um agente com --agent ou --agents-file")
+
+    collector = FleetCollector(addresses, args.interval, args.timeout, args.max_connecting)
+    server = CollectorServer(args.host, args.port, collector, workers=args.workers)
+
+    print(f"Coletando {len(addresses)} agentes")
+
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
+
+    print("Coletor encerrado")
+    sys.exit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+import asyncio
+import threading
+import time
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# Tamanho máximo do cabeçalho de uma requisição HTTP
+max_request_size = 16 * 1024
+
+
+def _gauge(lines: list, name: str, help_text: str, samples: list):
+    """Acrescenta um gauge no formato de exposição de texto; samples é uma lista de (rótulos, valor)"""
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} gauge")
+
+    for labels, value in samples:
+        if value is None:
+            continue
+
+        label_text = "{" + ",".join(f'{key}="{label}"' for key, label in labels.items()) + "}" if labels else ""
+        # Contagens inteiras (ex.: bytes) saem exatas, sem passar por float
+        value_text = str(value) if isinstance(value, int) and not isinstance(value, bool) else repr(float(value))
+        lines.append(f"{name}{label_text} {value_text}")
+
+
+def render_cpu(data: dict) -> list:
+    lines = []
+    _gauge(lines, "pb_cpu_usage_percent", "Uso total da CPU, em porcentagem.", [({}, data.get("usage"))])
+    _gauge(
+        lines,
+        "pb_cpu_core_usage_percent",
+        "Uso de cada núcleo da CPU, em porcentagem.",
+        [({"core": str(core)}, usage) for core, usage in enumerate(data.get("cores_usage") or [])],
+    )
+    _gauge(lines, "pb_cpu_frequency_mhz", "Frequência atual da CPU, em MHz.", [({}, data.get("current_frequency"))])
+
+    return lines
+
+
+def render_ram(data: dict) -> list:
+    lines = []
+
+    for field, name, help_text in (
+        ("total_bytes", "pb_memory_total_bytes", "Memória total, em bytes."),
+        ("used_bytes", "pb_memory_used_bytes", "Memória em uso, em bytes."),
+        ("available_bytes", "pb_memory_available_bytes", "Memória disponível, em bytes."),
+    ):
+        _gauge(lines, name, help_text, [({}, data.get(field))])
+
+    _gauge(lines, "pb_memory_usage_percent", "Uso da memória, em porcentagem.", [({}, data.get("percent_usage"))])
+
+    return lines
+
+
+def render_disk(data: dict) -> list:
+    lines = []
+
+    for field, name, help_text in (
+        ("total_bytes", "pb_disk_total_bytes", "Tamanho do disco, em bytes."),
+        ("used_bytes", "pb_disk_used_bytes", "Espaço em uso no disco, em bytes."),
+        ("available_bytes", "pb_disk_available_bytes", "Espaço livre no disco, em bytes."),
+    ):
+        _gauge(lines, name, help_text, [({}, data.get(field))])
+
+    _gauge(lines, "pb_disk_usage_percent", "Uso do disco, em porcentagem.", [({}, data.get("used_percent"))])
+
+    return lines
+
+
+def render_processes(data: list) -> list:
+    lines = []
+    _gauge(lines, "pb_processes", "Quantidade de processos.", [({}, len(data))])
+    _gauge(
+        lines,
+        "pb_process_threads",
+        "Soma das threads de todos os processos.",
+        [({}, sum(row.get("used_threads") or 0 for row in data))],
+    )
+
+    return lines
+
+
+# Métricas do Sampler expostas e a função que converte cada amostra em linhas de texto
+renderers = {
+    "cpu": render_cpu,
+    "ram": render_ram,
+    "disk": render_disk,
+    "processes": render_processes,
+}
+
+
+class MetricsExporter(object):
+    """Servidor HTTP que expõe as últimas amostras do Sampler no formato de texto do Prometheus/OpenMetrics.
+
+    Cada amostra é convertida em texto uma única vez; enquanto nenhuma métrica mudar, todas as
+    coletas recebem a mesma resposta já montada, sem passar pelo psutil."""
+
+    def __init__(self, sampler, host: str, port: int):
+        self.sampler = sampler
+        self.host = host
+        self.port = port
+        self.scrapes = 0
+        self.renders = 0
+
+        # Métrica -> (versão da amostra, linhas), e formato -> (versões de todas as métricas, corpo)
+        self._fragments = {}
+        self._bodies = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def _fragment(self, name: str, snapshot) -> list:
+        cached = self._fragments.get(name)
+
+        if cached is not None and cached[0] == snapshot.version:
+            return cached[1]
+
+        lines = renderers[name](snapshot.data)
+        # Horário da coleta convertido uma vez para o relógio do sistema, assim o texto não muda entre coletas
+        _gauge(
+            lines,
+            f"pb_{name}_sample_timestamp_seconds",
+            f"Horário da última amostra de {name}, em segundos desde a época Unix.",
+            [({}, time.time() - snapshot.age())],
+        )
+
+        self._fragments[name] = (snapshot.version, lines)
+        self.renders += 1
+
+        return lines
+
+    def body(self, openmetrics: bool = False) -> bytes:
+        """Texto com as amostras em cache; só é montado de novo quando alguma métrica tem amostra nova"""
+        # Lê só o cache: uma coleta nunca dispara uma leitura do psutil
+        snapshots = {name: self.sampler.cache.get(name) for name in renderers}
+        versions = tuple(None if snapshot is None else snapshot.version for snapshot in snapshots.values())
+
+        with self._lock:
+            cached = self._bodies.get(openmetrics)
+
+            if cached is not None and cached[0] == versions:
+                return cached[1]
+
+            lines = []
+
+            for name, snapshot in snapshots.items():
+                if snapshot is not None:
+                    lines.extend(self._fragment(name, snapshot))
+
+            if openmetrics:
+                lines.append("# EOF")
+
+            body = ("\n".join(lines) + "\n").encode("utf-8")
+            self._bodies[openmetrics] = (versions, body)
+
+            return body
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, limit=max_request_size)
+
+        print(f"Métricas HTTP em http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Atende as requisições de uma conexão, mantendo-a aberta entre coletas (keep-alive)"""
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except asyncio.IncompleteReadError:
+                    break
+
+                keep_alive = self._respond(head, writer)
+                await writer.drain()
+
+                if not keep_alive:
+                    break
+        except (asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def _respond(self, head: bytes, writer: asyncio.StreamWriter) -> bool:
+        lines = head.decode("latin-1").split("\r\n")
+        request_line = lines[0].split(" ")
+        headers = {}
+
+        for line in lines[1:]:
+            key, _, value = line.partition(":")
+            headers[key.strip().lower()] = value.strip()
+
+        if len(request_line) != 3:
+            self._write(writer, 400, "text/plain; charset=utf-8", b"Requisicao invalida\n", False)
+            return False
+
+        method, path, version = request_line
+        keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+
+        if method not in ("GET", "HEAD"):
+            # Um eventual corpo da requisição não é lido, então a conexão não pode ser reaproveitada
+            keep_alive = False
+            self._write(writer, 405, "text/plain; charset=utf-8", b"Metodo nao permitido\n", keep_alive)
+        elif path.split("?")[0] != "/metrics":
+            self._write(writer, 404, "text/plain; charset=utf-8", b"Use /metrics\n", keep_alive)
+        else:
+            openmetrics = "application/openmetrics-text" in headers.get("accept", "")
+            content_type = OPENMETRICS_CONTENT_TYPE if openmetrics else PROMETHEUS_CONTENT_TYPE
+
+            self.scrapes += 1
+            self._write(writer, 200, content_type, self.body(openmetrics), keep_alive, method == "HEAD")
+
+        return keep_alive
+
+    @staticmethod
+    def _write(
+        writer: asyncio.StreamWriter, status: int, content_type: str, body: bytes, keep_alive: bool, head_only=False
+    ):
+        reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}
+        header = (
+            f"HTTP/1.1 {status} {reasons[status]}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            "\r\n"
+        )
+
+        writer.write(header.encode("latin-1"))
+
+        if not head_only:
+            writer.write(body)
@@ -0,0 +1,487 @@
+import math
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+# Campos gravados no histórico de cada métrica; cada campo vira uma série "métrica.campo"
+history_fields = {
+    "cpu": ["usage", "cores_usage"],
+    "ram": ["percent_usage", "used_gb", "available_gb"],
+    "disk": ["used_percent", "used_gb"],
+}
+
+# Resoluções do rollup, em segundos; cada uma guarda os agregados abaixo de cada intervalo e a quantidade de amostras.
+# A resolução de 1 s são as próprias amostras, coletadas a cada segundo ou mais, então não tem rollup gravado
+rollup_tiers = (10, 60, 3600)
+rollup_aggregates = ("min", "avg", "max", "last")
+
+# Cabeçalho de um segmento: identificador, versão, largura, capacidade, início da partição e quantidade de linhas
+SEGMENT_MAGIC = b"PBHS"
+SEGMENT_VERSION = 1
+SEGMENT_HEADER = struct.Struct("<4sHxxIIdI")
+SEGMENT_HEADER_SIZE = 64
+COUNT_OFFSET = SEGMENT_HEADER.size - 4
+
+
+class HistoryError(ValueError):
+    """Consulta inválida ao histórico"""
+
+
+class Segment(object):
+    """Arquivo de tamanho fixo com uma coluna de horários e uma coluna float32 por valor, lido com mmap"""
+
+    def __init__(self, path: str, writable: bool = False):
+        self.path = path
+
+        with open(path, "rb") as segment_file:
+            magic, version, self.width, self.capacity, self.start, _ = SEGMENT_HEADER.unpack(
+                segment_file.read(SEGMENT_HEADER.size)
+            )
+
+        if magic != SEGMENT_MAGIC or version != SEGMENT_VERSION:
+            raise HistoryError(f"Segmento inválido: {path}")
+
+        mode = "r+" if writable else "r"
+
+        self._count = np.memmap(path, dtype="<u4", mode=mode, offset=COUNT_OFFSET, shape=(1,))
+        self.timestamps = np.memmap(path, dtype="<f8", mode=mode, offset=SEGMENT_HEADER_SIZE, shape=(self.capacity,))
+        self.values = np.memmap(
+            path,
+            dtype="<f4",
+            mode=mode,
+            offset=SEGMENT_HEADER_SIZE + 8 * self.capacity,
+            shape=(self.width, self.capacity),
+        )
+
+    @classmethod
+    def create(cls, path: str, width: int, capacity: int, start: float):
+        """Cria o arquivo já com o tamanho final; as páginas ainda não escritas não ocupam disco"""
+        with open(path + ".tmp", "wb") as segment_file:
+            segment_file.write(SEGMENT_HEADER.pack(SEGMENT_MAGIC, SEGMENT_VERSION, width, capacity, start, 0))
+            segment_file.truncate(SEGMENT_HEADER_SIZE + (8 + 4 * width) * capacity)
+
+        os.replace(path + ".tmp", path)
+
+        return cls(path, writable=True)
+
+    @property
+    def count(self) -> int:
+        return int(self._count[0])
+
+    def full(self) -> bool:
+        return self.count >= self.capacity
+
+    def append(self, timestamp: float, values):
+        index = self.count
+
+        self.timestamps[index] = timestamp
+        self.values[:, index] = values
+        # O contador é gravado por último, assim uma linha só é lida depois de completa
+        self._count[0] = index + 1
+
+    def read(self, start: float, end: float):
+        """Copia as linhas no intervalo; a busca binária nos horários só toca as páginas necessárias"""
+        count = self.count
+        timestamps = self.timestamps[:count]
+
+        first = int(np.searchsorted(timestamps, start, "left"))
+        last = int(np.searchsorted(timestamps, end, "right"))
+
+        return np.array(timestamps[first:last]), np.array(self.values[:, first:last])
+
+    def compact(self):
+        """Regrava o segmento com a capacidade igual à quantidade de linhas, liberando o espaço reservado"""
+        count = self.count
+
+        if count == self.capacity:
+            return
+
+        compacted = Segment.create(self.path + ".compact", self.width, count, self.start)
+        compacted.timestamps[:] = self.timestamps[:count]
+        compacted.values[:] = self.values[:, :count]
+        compacted._count[0] = count
+        compacted.flush()
+        del compacted
+
+        os.replace(self.path + ".compact", self.path)
+
+    def flush(self):
+        self.timestamps.flush()
+        self.values.flush()
+        self._count.flush()
+
+
+class Rollup(object):
+    """Agregados do intervalo em aberto de uma série em uma resolução, atualizados a cada amostra"""
+
+    def __init__(self, seconds: int, width: int):
+        self.seconds = seconds
+        self.width = width
+        self.bucket = None
+        self.count = 0
+
+        self.minimum = np.zeros(width)
+        self.total = np.zeros(width)
+        self.maximum = np.zeros(width)
+        self.last = np.zeros(width)
+
+    def add(self, timestamp: float, values):
+        """Soma a amostra ao intervalo; se ela abre um intervalo novo, retorna o início e a linha do que fechou"""
+        bucket = math.floor(timestamp / self.seconds) * self.seconds
+        closed = None
+
+        if bucket != self.bucket:
+            if self.count:
+                closed = self.bucket, self.row()
+
+            self.bucket = bucket
+            self.count = 1
+            self.minimum[:] = values
+            self.total[:] = values
+            self.maximum[:] = values
+            self.last[:] = values
+        else:
+            self.count += 1
+            np.minimum(self.minimum, values, out=self.minimum)
+            np.maximum(self.maximum, values, out=self.maximum)
+            self.total += values
+            self.last[:] = values
+
+        return closed
+
+    def row(self) -> np.ndarray:
+        """Linha gravada no disco: mínimos, médias, máximos e últimos valores de cada coluna e a quantidade"""
+        return np.concatenate((self.minimum, self.total / self.count, self.maximum, self.last, [self.count]))
+
+
+class HistoryStore(object):
+    """Histórico em disco: um diretório por série, com segmentos colunares particionados por tempo"""
+
+    def __init__(self, directory: str, segment_seconds: float = 3600.0, retention: float = 7 * 86400.0):
+        self.directory = directory
+        self.segment_seconds = segment_seconds
+        self.retention = retention
+        self.version = 0
+
+        # Série -> segmento aberto para escrita; (série, resolução) -> intervalo em aberto do rollup
+        self._writers = {}
+        self._rollups = {}
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+
+    def series(self) -> list:
+        """Séries gravadas; os diretórios do rollup ("série@segundos") ficam de fora"""
+        return sorted(name for name in os.listdir(self.directory) if not name.startswith(".") and "@" not in name)
+
+    def _partition_seconds(self, name: str) -> float:
+        """Duração da partição de uma série; no rollup ela cresce com a resolução, mantendo as linhas por arquivo.
+
+        A retenção apaga partições inteiras, então no rollup a duração fica limitada a um oitavo da retenção
+        (ou à de uma partição das amostras, se for maior), e os dados duram no máximo isso além da retenção."""
+        _, _, seconds = name.partition("@")
+
+        if not seconds:
+            return self.segment_seconds
+
+        return min(self.segment_seconds * int(seconds), max(self.segment_seconds, self.retention / 8))
+
+    def record(self, snapshot, timestamp: float = None):
+        """Grava os campos de uma amostra; usado como ouvinte do Sampler"""
+        fields = history_fields.get(snapshot.name)
+
+        if not fields:
+            return
+
+        timestamp = time.time() if timestamp is None else timestamp
+
+        for field in fields:
+            value = snapshot.data.get(field)
+
+            if value is None:
+                continue
+
+            values = value if isinstance(value, (list, tuple)) else [value]
+            self.append(f"{snapshot.name}.{field}", timestamp, values)
+
+    def append(self, series: str, timestamp: float, values: list):
+        """Grava a amostra e atualiza os intervalos do rollup, gravando os que fecharam"""
+        with self._lock:
+            self._append(series, timestamp, values)
+            values = np.asarray(values, dtype=np.float64)
+
+            for seconds in rollup_tiers:
+                rollup = self._rollups.get((series, seconds))
+
+                if rollup is None or rollup.width != len(values):
+                    rollup = Rollup(seconds, len(values))
+                    self._rollups[series, seconds] = rollup
+
+                closed = rollup.add(timestamp, values)
+
+                if closed is not None:
+                    self._append(f"{series}@{seconds}", *closed)
+
+            self.version += 1
+
+    def _append(self, name: str, timestamp: float, values):
+        partition_seconds = self._partition_seconds(name)
+        partition = math.floor(timestamp / partition_seconds) * partition_seconds
+        segment = self._writers.get(name)
+
+        if segment is None or segment.start != partition or segment.width != len(values) or segment.full():
+            if segment is not None:
+                self._close(segment, partition_seconds)
+
+            segment = self._open_writer(name, partition, len(values))
+            self._writers[name] = segment
+
+        segment.append(timestamp, values)
+
+    def _open_writer(self, series: str, partition: float, width: int) -> Segment:
+        directory = os.path.join(self.directory, series)
+        os.makedirs(directory, exist_ok=True)
+
+        # Retoma o último segmento da partição se ele ainda tiver espaço e a mesma largura
+        paths = self._segment_paths(series, partition, partition)
+
+        if paths:
+            segment = Segment(paths[-1], writable=True)
+
+            if segment.width == width and not segment.full():
+                return segment
+
+            sequence = int(os.path.basename(paths[-1]).split("_")[1].split(".")[0]) + 1
+        else:
+            sequence = 0
+
+        self._apply_retention(series, partition)
+
+        # Capacidade para uma linha por segundo (ou por intervalo, no rollup); se faltar espaço, abre outro segmento
+        capacity = max(1, math.ceil(self.segment_seconds))
+        path = os.path.join(directory, f"{int(partition)}_{sequence}.seg")
+
+        return Segment.create(path, width, capacity, partition)
+
+    def _close(self, segment: Segment, partition_seconds: float):
+        segment.flush()
+
+        # Segmentos de partições passadas não recebem mais linhas e podem ser compactados
+        if segment.full() or segment.start + partition_seconds <= time.time():
+            segment.compact()
+
+    def _apply_retention(self, series: str, now: float):
+        """Apaga os segmentos cujas partições terminaram antes do período de retenção"""
+        limit = now - self.retention
+
+        for path in self._segment_paths(series, -math.inf, limit - self._partition_seconds(series)):
+            os.remove(path)
+
+    def _segment_paths(self, series: str, start: float, end: float) -> list:
+        """Arquivos de segmento das partições que começam entre start e end, em ordem"""
+        directory = os.path.join(self.directory, series)
+
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return []
+
+        segments = []
+
+        for name in names:
+            if not name.endswith(".seg"):
+                continue
+
+            partition, sequence = name[:-4].split("_")
+
+            if start <= int(partition) <= end:
+                segments.append((int(partition), int(sequence), os.path.join(directory, name)))
+
+        return [path for _, _, path in sorted(segments)]
+
+    def query(
+        self,
+        series: str,
+        start: float,
+        end: float = None,
+        step: float = None,
+        points: int = None,
+        max_rows: int = None,
+    ) -> dict:
+        """Linhas de uma série entre start e end; com step, a média de cada intervalo de step segundos.
+
+        Com points, retorna no máximo points intervalos com min/avg/max/last, lidos da resolução
+        mais grossa do rollup que ainda tem ao menos um intervalo por ponto.
+
+        Com max_rows, o passo é aumentado até caber em max_rows intervalos, e uma consulta sem passo
+        que passaria de max_rows linhas é recusada."""
+        if end is None:
+            end = time.time()
+
+        if end < start:
+            raise HistoryError("O fim do intervalo é anterior ao início")
+
+        if step is not None and step <= 0:
+            raise HistoryError("O passo deve ser positivo")
+
+        if points is not None:
+            return self._query_rollup(series, start, end, points)
+
+        if step is not None and max_rows is not None:
+            # O intervalo que contém end também conta, então o período é dividido em max_rows - 1 passos
+            step = max(step, (end - start) / max(max_rows - 1, 1))
+
+        timestamps, values = self._read(series, start, end, None if step is not None else max_rows)
+
+        if timestamps is None:
+            return {"series": series, "count": 0, "columns": 0, "timestamps": b"", "values": b""}
+
+        if step is not None and len(timestamps):
+            timestamps, values = downsample(timestamps, values, start, step)
+
+        return {
+            "series": series,
+            "count": len(timestamps),
+            "columns": values.shape[0],
+            # Colunas enviadas como bytes: float64 para os horários e float32 coluna por coluna para os valores
+            "timestamps": timestamps.astype("<f8").tobytes(),
+            "values": np.ascontiguousarray(values, dtype="<f4").tobytes(),
+        }
+
+    def _query_rollup(self, series: str, start: float, end: float, points: int) -> dict:
+        if points < 1:
+            raise HistoryError("A quantidade de pontos deve ser positiva")
+
+        step = max((end - start) / points, 1e-3)
+        resolution = max((seconds for seconds in rollup_tiers if seconds <= step), default=0)
+
+        if resolution:
+            # Intervalos que começam antes de start mas ainda o cobrem também entram
+            timestamps, rows = self._read(f"{series}@{resolution}", start - resolution, end)
+
+            with self._lock:
+                rollup = self._rollups.get((series, resolution))
+
+                if rollup is not None and rollup.count and start - resolution <= rollup.bucket <= end:
+                    if timestamps is None or rows.shape[0] == len(rollup.row()):
+                        timestamps = np.append(timestamps if timestamps is not None else [], rollup.bucket)
+                        rows = np.column_stack((rows, rollup.row())) if rows is not None else rollup.row()[:, None]
+        else:
+            # Passo menor que o primeiro nível do rollup: cada amostra é um intervalo com uma amostra
+            timestamps, values = self._read(series, start, end)
+
+            if timestamps is not None:
+                rows = np.vstack((values, values, values, values, np.ones((1, len(timestamps)), np.float32)))
+
+        if timestamps is None or not len(timestamps):
+            return {
+                "series": series, "count": 0, "columns": 0, "aggregates": list(rollup_aggregates),
+                "resolution": resolution, "step": step, "timestamps": b"", "values": b"",
+            }
+
+        # O fim do período cairia em um intervalo a mais: os horários ficam entre start e o início do último intervalo
+        timestamps, rows = merge_rollups(np.clip(timestamps, start, start + (points - 1) * step), rows, start, step)
+
+        return {
+            "series": series,
+            "count": len(timestamps),
+            "columns": (rows.shape[0] - 1) // len(rollup_aggregates),
+            "aggregates": list(rollup_aggregates),
+            "resolution": resolution,
+            "step": step,
+            "timestamps": timestamps.astype("<f8").tobytes(),
+            # Um bloco de colunas por agregado, na ordem de aggregates; a quantidade de amostras não é enviada
+            "values": np.ascontiguousarray(rows[:-1], dtype="<f4").tobytes(),
+        }
+
+    def _read(self, series: str, start: float, end: float, max_rows: int = None):
+        """Concatena as linhas dos segmentos no intervalo; retorna (None, None) se não houver segmentos"""
+        partition_seconds = self._partition_seconds(series)
+        first_partition = math.floor(start / partition_seconds) * partition_seconds
+        timestamps = []
+        values = []
+        rows = 0
+
+        for path in self._segment_paths(series, first_partition, end):
+            segment = Segment(path)
+            segment_timestamps, segment_values = segment.read(start, end)
+
+            # Se a largura mudou (ex.: outra quantidade de núcleos), vale a mais recente
+            if values and segment.width != values[-1].shape[0]:
+                timestamps, values, rows = [], [], 0
+
+            timestamps.append(segment_timestamps)
+            values.append(segment_values)
+            rows += len(segment_timestamps)
+
+            # Para antes de copiar o resto do período
+            if max_rows is not None and rows > max_rows:
+                raise HistoryError(f"O período tem mais de {max_rows} linhas; use step ou points")
+
+        if not timestamps:
+            return None, None
+
+        return np.concatenate(timestamps), np.concatenate(values, axis=1)
+
+    def close(self):
+        with self._lock:
+            for segment in self._writers.values():
+                segment.flush()
+
+            self._writers = {}
+
+
+def downsample(timestamps: np.ndarray, values: np.ndarray, start: float, step: float):
+    """Média de cada intervalo de step segundos que tem ao menos uma linha"""
+    buckets = np.floor((timestamps - start) / step).astype(np.int64)
+    firsts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+    counts = np.diff(np.append(firsts, len(timestamps)))
+
+    means = np.add.reduceat(values.astype(np.float64), firsts, axis=1) / counts
+
+    return start + buckets[firsts] * step, means.astype(np.float32)
+
+
+def merge_rollups(timestamps: np.ndarray, rows: np.ndarray, start: float, step: float):
+    """Junta as linhas do rollup em intervalos de step segundos, combinando cada agregado do jeito certo"""
+    width = (rows.shape[0] - 1) // len(rollup_aggregates)
+    minimums, averages, maximums, lasts, counts = (
+        rows[:width], rows[width:2 * width], rows[2 * width:3 * width], rows[3 * width:4 * width], rows[-1]
+    )
+
+    buckets = np.floor((timestamps - start) / step).astype(np.int64)
+    firsts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+    ends = np.append(firsts[1:], len(timestamps)) - 1
+
+    total_counts = np.add.reduceat(counts.astype(np.float64), firsts)
+
+    merged = np.vstack((
+        np.minimum.reduceat(minimums, firsts, axis=1),
+        np.add.reduceat(averages * counts.astype(np.float64), firsts, axis=1) / total_counts,
+        np.maximum.reduceat(maximums, firsts, axis=1),
+        lasts[:, ends],
+        total_counts,
+    ))
+
+    return start + buckets[firsts] * step, merged
+
+
+def decode_range(result: dict):
+    """Converte a resposta de uma consulta ao histórico em arrays: horários (n,) e valores (colunas, n)"""
+    timestamps = np.frombuffer(result["timestamps"], dtype="<f8")
+    values = np.frombuffer(result["values"], dtype="<f4").reshape(result["columns"], result["count"])
+
+    return timestamps, values
+
+
+def decode_rollup(result: dict):
+    """Converte a resposta de uma consulta com points em horários (n,) e um array (colunas, n) por agregado"""
+    timestamps = np.frombuffer(result["timestamps"], dtype="<f8")
+    values = np.frombuffer(result["values"], dtype="<f4").reshape(
+        len(result["aggregates"]), result["columns"], result["count"]
+    )
+
+    return timestamps, dict(zip(result["aggregates"], values))
@@ -0,0 +1,147 @@
+import asyncio
+import socket
+import threading
+import time
+
+import psutil
+
+
+def parse_ports(ports: str) -> list:
+    """Converte uma lista de portas como "22-443,8080" em uma lista de inteiros"""
+    result = set()
+
+    for part in ports.split(","):
+        part = part.strip()
+
+        if not part:
+            continue
+
+        first, _, last = part.partition("-")
+        first = int(first)
+        last = int(last or first)
+
+        if not 1 <= first <= last <= 65535:
+            raise ValueError(f"Intervalo de portas inválido: {part}")
+
+        result.update(range(first, last + 1))
+
+    return sorted(result)
+
+
+def get_interfaces() -> list:
+    interfaces = []
+
+    for interface_name, interface_addresses in psutil.net_if_addrs().items():
+        for address in interface_addresses:
+            if address.family == socket.AF_INET:
+                interfaces.append({
+                    "interface": interface_name,
+                    "address": address.address,
+                    "netmask": address.netmask if address.netmask is not None else "Ausente",
+                })
+
+    return interfaces
+
+
+class ConnectScanner(object):
+    """Verifica portas TCP abertas tentando conectar em várias portas ao mesmo tempo"""
+
+    def __init__(self, timeout: float = 0.5, concurrency: int = 256):
+        self.timeout = timeout
+        self.concurrency = concurrency
+
+    def scan(self, targets: list, ports: list) -> list:
+        """Executa a varredura de todos os alvos e retorna os hosts no formato enviado ao cliente"""
+        return asyncio.run(self._scan(targets, ports))
+
+    async def _scan(self, targets: list, ports: list) -> list:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        return await asyncio.gather(*(self._scan_host(semaphore, target, ports) for target in targets))
+
+    async def _scan_host(self, semaphore: asyncio.Semaphore, target: str, ports: list) -> dict:
+        states = await asyncio.gather(*(self._probe(semaphore, target, port) for port in ports))
+        open_ports = [{"port": port, "state": "open"} for port, state in zip(ports, states) if state == "open"]
+
+        return {
+            "host": target,
+            "name": await asyncio.get_running_loop().run_in_executor(None, self._host_name, target),
+            "state": "up" if any(state in ("open", "closed") for state in states) else "down",
+            "protocols": [{"protocol": "tcp", "ports": open_ports}],
+        }
+
+    async def _probe(self, semaphore: asyncio.Semaphore, target: str, port: int) -> str:
+        async with semaphore:
+            try:
+                _, writer = await asyncio.wait_for(asyncio.open_connection(target, port), self.timeout)
+            except ConnectionRefusedError:
+                return "closed"
+            except (OSError, asyncio.TimeoutError):
+                return "filtered"
+
+            writer.close()
+
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+            return "open"
+
+    @staticmethod
+    def _host_name(target: str) -> str:
+        try:
+            return socket.gethostbyaddr(target)[0]
+        except OSError:
+            return ""
+
+
+class NetworkInventory(object):
+    """Lista as interfaces na hora e mantém em cache o resultado das varreduras feitas em segundo plano"""
+
+    def __init__(self, targets: list = None, ports: str = "22-443", interval: float = 300.0, ttl: float = 900.0):
+        self.targets = targets or ["127.0.0.1"]
+        self.ports = ports
+        self.interval = interval
+        self.ttl = ttl
+        self.scanner = ConnectScanner()
+
+        self._hosts = []
+        self._scanned_at = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Inicia a varredura periódica em uma thread separada"""
+        self._thread = threading.Thread(target=self._loop, name="varredura-rede", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def hosts(self) -> list:
+        """Resultado da última varredura, ou uma lista vazia se ele já expirou"""
+        with self._lock:
+            if self._scanned_at is None or time.monotonic() - self._scanned_at > self.ttl:
+                return []
+
+            return self._hosts
+
+    def info(self) -> dict:
+        return {"interfaces": get_interfaces(), "hosts": self.hosts()}
+
+    def _loop(self):
+        ports = parse_ports(self.ports)
+
+        while not self._stop_event.is_set():
+            try:
+                hosts = self.scanner.scan(self.targets, ports)
+
+                with self._lock:
+                    self._hosts = hosts
+                    self._scanned_at = time.monotonic()
+            except Exception as error:
+                print(f"Falha na varredura de rede: {error}")
+
+            self._stop_event.wait(self.interval)
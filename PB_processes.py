@@ -0,0 +1,321 @@
+import heapq
+import threading
+import time
+from collections import deque
+from operator import itemgetter
+
+import psutil
+
+from PB_codec import CODEC_COMPACT
+from PB_protocol import encode_payload
+
+mb = 1024 * 1024
+
+# Campos que mudam a cada amostra, lidos juntos com oneshot() pelo process_iter
+volatile_attrs = ["memory_info", "num_threads", "cpu_times", "num_ctx_switches"]
+
+# Nem todas as plataformas têm contadores de E/S por processo (ex.: macOS)
+if hasattr(psutil.Process, "io_counters"):
+    volatile_attrs.append("io_counters")
+
+
+class ProcessCollector(object):
+    """Coleta a tabela de processos reaproveitando os dados fixos de cada processo entre as amostras"""
+
+    def __init__(self):
+        # (pid, create_time) -> campos fixos; create_time diferencia pids reutilizados
+        self._static = {}
+        # (pid, create_time) -> contadores da amostra anterior, usados para calcular as taxas
+        self._counters = {}
+        self._sampled_at = None
+
+    def _static_fields(self, process) -> dict:
+        key = (process.pid, process.create_time())
+        fields = self._static.get(key)
+
+        if fields is None:
+            fields = {
+                "pid": process.pid,
+                "name": process.name(),
+                "created_date": time.ctime(key[1]),
+            }
+            self._static[key] = fields
+
+        return key, fields
+
+    def collect(self) -> list:
+        """Lê todos os processos em uma passada; CPU, E/S e trocas de contexto são taxas desde a amostra anterior"""
+        total_memory = psutil.virtual_memory().total
+        processes = []
+        seen = set()
+
+        now = time.monotonic()
+        elapsed = now - self._sampled_at if self._sampled_at is not None else None
+        previous_counters = self._counters
+        counters = {}
+
+        for process in psutil.process_iter(volatile_attrs, ad_value=None):
+            try:
+                key, fields = self._static_fields(process)
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                continue
+
+            seen.add(key)
+
+            info = process.info
+            memory_info = info["memory_info"]
+            cpu_times = info["cpu_times"]
+            ctx_switches = info["num_ctx_switches"]
+            io_counters = info.get("io_counters")
+            rss = memory_info.rss if memory_info is not None else 0
+
+            current = (
+                cpu_times.user + cpu_times.system if cpu_times is not None else None,
+                io_counters.read_bytes if io_counters is not None else None,
+                io_counters.write_bytes if io_counters is not None else None,
+                ctx_switches.voluntary + ctx_switches.involuntary if ctx_switches is not None else None,
+            )
+            counters[key] = current
+
+            cpu_percent, read_rate, write_rate, ctx_switch_rate = rates(previous_counters.get(key), current, elapsed)
+
+            processes.append({
+                **fields,
+                "used_memory": rss / mb,
+                "memory_use_percent": rss / total_memory * 100,
+                "used_threads": info["num_threads"] or 0,
+                "cpu_time": current[0] or 0.0,
+                "cpu_percent": round(cpu_percent * 100, 1),
+                "read_rate": round(read_rate),
+                "write_rate": round(write_rate),
+                "ctx_switch_rate": round(ctx_switch_rate),
+            })
+
+        for key in self._static.keys() - seen:
+            del self._static[key]
+
+        self._counters = counters
+        self._sampled_at = now
+
+        processes.reverse()
+
+        return processes
+
+
+def rates(previous: tuple, current: tuple, elapsed: float) -> list:
+    """Variação por segundo de cada contador; zero na primeira amostra do processo ou se o contador não existe"""
+    if previous is None or not elapsed:
+        return [0.0] * len(current)
+
+    return [
+        max(new - old, 0) / elapsed if new is not None and old is not None else 0.0
+        for old, new in zip(previous, current)
+    ]
+
+
+# Campos comparados entre amostras para montar as diferenças da tabela
+changing_fields = [
+    "used_memory",
+    "memory_use_percent",
+    "used_threads",
+    "cpu_time",
+    "cpu_percent",
+    "read_rate",
+    "write_rate",
+    "ctx_switch_rate",
+]
+
+
+class ProcessTableStream(object):
+    """Transforma as amostras da tabela de processos em uma sequência de diferenças compartilhada pelos clientes"""
+
+    def __init__(self, history: int = 16):
+        self.sequence = 0
+
+        self._snapshot_version = None
+        self._table = {}
+        self._deltas = deque(maxlen=history)
+        self._bodies = {}
+        self._lock = threading.Lock()
+
+    def body(self, snapshot, since: int, codec: int = CODEC_COMPACT):
+        """Retorna a sequência atual e a resposta serializada para um cliente que já conhece a tabela até since"""
+        with self._lock:
+            self._ingest(snapshot)
+
+            incremental = self._can_resume(since)
+            key = (codec, since if incremental else None)
+            body = self._bodies.get(key)
+
+            if body is None:
+                if incremental:
+                    response = {
+                        "sequence": self.sequence,
+                        "base": since,
+                        "full": False,
+                        "deltas": [delta for delta in self._deltas if delta["sequence"] > since],
+                    }
+                else:
+                    response = {"sequence": self.sequence, "full": True, "processes": list(self._table.values())}
+
+                body = encode_payload(response, codec)
+                self._bodies[key] = body
+
+            return self.sequence, body
+
+    def _can_resume(self, since) -> bool:
+        if not since or since > self.sequence:
+            return False
+
+        if since == self.sequence:
+            return True
+
+        return bool(self._deltas) and self._deltas[0]["sequence"] <= since + 1
+
+    def _ingest(self, snapshot):
+        """Calcula a diferença entre a última amostra conhecida e a nova, uma vez por amostra"""
+        if snapshot.version == self._snapshot_version:
+            return
+
+        table = {row["pid"]: row for row in snapshot.data}
+        added = []
+        changed = {}
+
+        for pid, row in table.items():
+            previous = self._table.get(pid)
+
+            if previous is None or previous["created_date"] != row["created_date"]:
+                added.append(row)
+                continue
+
+            fields = {field: row[field] for field in changing_fields if row[field] != previous[field]}
+
+            if fields:
+                changed[pid] = fields
+
+        removed = [pid for pid in self._table if pid not in table]
+
+        self.sequence += 1
+        self._deltas.append({"sequence": self.sequence, "added": added, "removed": removed, "changed": changed})
+
+        self._table = table
+        self._snapshot_version = snapshot.version
+        self._bodies = {}
+
+
+# Campos aceitos como chave de ordenação nas consultas
+query_sort_fields = ["pid", "name", *changing_fields]
+
+
+class TableQuery(object):
+    """Base das consultas a uma tabela de registros: ordenação por um campo, deslocamento e limite"""
+
+    sort_fields = []
+    # Campo que desempata a ordenação, para que a mesma consulta sempre retorne a mesma ordem
+    tie_field = None
+
+    def __init__(self, sort: str, descending: bool = True, limit: int = None, offset: int = 0):
+        if sort not in self.sort_fields:
+            raise ValueError(f"Campo de ordenação inválido: {sort}")
+        # bool é subclasse de int, mas True como limite (1) quase certamente é um erro de quem fez a consulta
+        if limit is not None and (not isinstance(limit, int) or isinstance(limit, bool) or limit < 0):
+            raise ValueError(f"Limite inválido: {limit}")
+        if not isinstance(offset, int) or isinstance(offset, bool) or offset < 0:
+            raise ValueError(f"Deslocamento inválido: {offset}")
+
+        self.sort = sort
+        self.descending = bool(descending)
+        self.limit = limit
+        self.offset = offset
+
+    @classmethod
+    def from_request(cls, query: dict):
+        if not isinstance(query, dict):
+            raise ValueError("A consulta deve ser um dicionário")
+
+        try:
+            return cls(**query)
+        except TypeError as error:
+            raise ValueError(f"Parâmetro de consulta inválido: {error}") from None
+
+    def select(self, rows: list) -> list:
+        """Ordena as linhas; com limite, só os primeiros offset + limit registros são ordenados"""
+        key = itemgetter(self.sort, self.tie_field)
+
+        if self.limit is None:
+            selected = sorted(rows, key=key, reverse=self.descending)
+        else:
+            select = heapq.nlargest if self.descending else heapq.nsmallest
+            selected = select(self.offset + self.limit, rows, key=key)
+
+        return selected[self.offset:]
+
+
+class ProcessQuery(TableQuery):
+    """Consulta à tabela de processos feita no servidor: filtro, ordenação, deslocamento e limite"""
+
+    sort_fields = query_sort_fields
+    tie_field = "pid"
+
+    def __init__(
+        self,
+        sort: str = "used_memory",
+        descending: bool = True,
+        limit: int = None,
+        name: str = None,
+        min_memory: float = None,
+        offset: int = 0,
+    ):
+        super().__init__(sort, descending, limit, offset)
+
+        if name is not None and not isinstance(name, str):
+            raise ValueError(f"Filtro de nome inválido: {name}")
+        if min_memory is not None and (not isinstance(min_memory, (int, float)) or isinstance(min_memory, bool)):
+            raise ValueError(f"Memória mínima inválida: {min_memory}")
+
+        self.name = name.lower() if name else None
+        # RSS mínimo, em MB, como o campo used_memory
+        self.min_memory = min_memory
+
+    def key(self) -> tuple:
+        return self.sort, self.descending, self.limit, self.name, self.min_memory, self.offset
+
+    def run(self, rows: list) -> dict:
+        """Filtra e ordena as linhas; com limite, só os primeiros offset + limit registros são ordenados"""
+        matched = rows
+
+        if self.name:
+            name = self.name
+            matched = [row for row in matched if name in row["name"].lower()]
+
+        if self.min_memory:
+            min_memory = self.min_memory
+            matched = [row for row in matched if row["used_memory"] >= min_memory]
+
+        return {"total": len(matched), "offset": self.offset, "processes": self.select(matched)}
+
+
+class ProcessQueryCache(object):
+    """Respostas das consultas sobre a amostra atual, compartilhadas entre os clientes que fazem a mesma consulta"""
+
+    def __init__(self, capacity: int = 256):
+        self.capacity = capacity
+
+        self._snapshot_version = None
+        self._bodies = {}
+        self._lock = threading.Lock()
+
+    def body(self, snapshot, query: ProcessQuery, codec: int = CODEC_COMPACT) -> bytes:
+        with self._lock:
+            if snapshot.version != self._snapshot_version or len(self._bodies) >= self.capacity:
+                self._snapshot_version = snapshot.version
+                self._bodies = {}
+
+            key = (query.key(), codec)
+            body = self._bodies.get(key)
+
+            if body is None:
+                body = encode_payload(query.run(snapshot.data), codec)
+                self._bodies[key] = body
+
+            return body
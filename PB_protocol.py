@@ -0,0 +1,147 @@
+import struct
+
+from PB_codec import CODEC_COMPACT, CODEC_PICKLE, CodecError, codecs
+
+# Cabeçalho fixo de cada mensagem: tamanho do corpo, tipo da mensagem, formato do corpo e id da requisição
+HEADER = struct.Struct("!IHBI")
+HEADER_SIZE = HEADER.size
+
+MESSAGE_REQUEST = 1
+MESSAGE_RESPONSE = 2
+MESSAGE_ERROR = 3
+MESSAGE_SUBSCRIBE = 4
+MESSAGE_UNSUBSCRIBE = 5
+MESSAGE_PUSH = 6
+
+# Limite das respostas lidas pelo cliente e pelo coletor, e das requisições aceitas pelo servidor
+MAX_MESSAGE_SIZE = 64 * 1024 * 1024
+MAX_REQUEST_SIZE = 1024 * 1024
+
+
+class ProtocolError(Exception):
+    """Erro de formatação de uma mensagem recebida"""
+
+
+class ServerError(Exception):
+    """Erro informado pelo servidor em resposta a uma requisição"""
+
+
+def encode_payload(payload, codec: int = CODEC_COMPACT, schema: str = None) -> bytes:
+    """Serializa o corpo de uma mensagem, usando o esquema da métrica quando o formato tiver um"""
+    return codecs[codec].encode(payload, schema)
+
+
+def frame_message(message_type: int, request_id: int, body: bytes, codec: int = CODEC_COMPACT) -> bytes:
+    """Monta a mensagem com o cabeçalho a partir de um corpo já serializado"""
+    return HEADER.pack(len(body), message_type, codec, request_id) + body
+
+
+def encode_message(message_type: int, request_id: int, payload, codec: int = CODEC_COMPACT, schema: str = None) -> bytes:
+    """Serializa o corpo e monta a mensagem com o cabeçalho"""
+    return frame_message(message_type, request_id, encode_payload(payload, codec, schema), codec)
+
+
+def decode_payload(body: memoryview, codec: int = CODEC_COMPACT):
+    """Desserializa o corpo de uma mensagem"""
+    return codecs[codec].decode(body)
+
+
+def decode_batch(results: list, codec: int = CODEC_COMPACT) -> list:
+    """Desserializa os itens de uma resposta em lote; um item com erro vira um ServerError na mesma posição"""
+    return [
+        decode_payload(item["body"], codec) if "body" in item else ServerError(item["error"])
+        for item in results
+    ]
+
+
+def send_message(socket_object, message_type: int, request_id: int, payload, codec: int = CODEC_COMPACT):
+    """Envia uma mensagem completa pelo socket"""
+    socket_object.sendall(encode_message(message_type, request_id, payload, codec))
+
+
+class FrameReader(object):
+    """Remonta as mensagens recebidas a partir de um buffer pré-alocado"""
+
+    def __init__(
+        self,
+        initial_size: int = 64 * 1024,
+        allowed_codecs=(CODEC_COMPACT, CODEC_PICKLE),
+        max_message_size: int = MAX_MESSAGE_SIZE,
+    ):
+        self.allowed_codecs = set(allowed_codecs)
+        # O buffer cresce assim que um cabeçalho chega, então o limite vale antes de qualquer byte do corpo
+        self.max_message_size = max_message_size
+
+        self._buffer = bytearray(initial_size)
+        self._view = memoryview(self._buffer)
+        self._start = 0
+        self._end = 0
+
+    def get_buffer(self) -> memoryview:
+        """Retorna a área livre do buffer, onde os próximos bytes devem ser escritos"""
+        if self._end == len(self._buffer):
+            self._make_room()
+
+        return self._view[self._end:]
+
+    def buffer_updated(self, nbytes: int):
+        """Registra que nbytes foram escritos na área livre do buffer"""
+        self._end += nbytes
+
+    def receive(self, socket_object) -> int:
+        """Lê do socket diretamente para o buffer"""
+        nbytes = socket_object.recv_into(self.get_buffer())
+        self.buffer_updated(nbytes)
+
+        return nbytes
+
+    def messages(self):
+        """Retorna as mensagens completas presentes no buffer como (tipo, id, corpo, formato)"""
+        while self._end - self._start >= HEADER_SIZE:
+            length, message_type, codec, request_id = HEADER.unpack_from(self._buffer, self._start)
+
+            if length > self.max_message_size:
+                raise ProtocolError(f"Mensagem de {length} bytes excede o limite")
+
+            if codec not in self.allowed_codecs:
+                raise ProtocolError(f"Formato de mensagem não aceito: {codec}")
+
+            frame_end = self._start + HEADER_SIZE + length
+
+            if frame_end > self._end:
+                if frame_end - self._start > len(self._buffer):
+                    self._make_room(HEADER_SIZE + length)
+
+                break
+
+            body = self._view[self._start + HEADER_SIZE:frame_end]
+            self._start = frame_end
+
+            try:
+                payload = decode_payload(body, codec)
+            except CodecError as error:
+                raise ProtocolError(str(error)) from error
+
+            yield message_type, request_id, payload, codec
+
+        if self._start == self._end:
+            self._start = self._end = 0
+
+    def _make_room(self, frame_size: int = 0):
+        """Move os bytes pendentes para o início do buffer e o aumenta se necessário"""
+        pending = self._end - self._start
+        size = len(self._buffer)
+
+        while size < max(frame_size, pending + 1):
+            size *= 2
+
+        if size != len(self._buffer):
+            new_buffer = bytearray(size)
+            new_buffer[:pending] = self._buffer[self._start:self._end]
+            self._buffer = new_buffer
+            self._view = memoryview(self._buffer)
+        else:
+            self._buffer[:pending] = self._buffer[self._start:self._end]
+
+        self._start = 0
+        self._end = pending
@@ -0,0 +1,157 @@
+import math
+import threading
+import time
+
+from PB_codec import CODEC_COMPACT
+from PB_protocol import encode_payload
+
+# Métricas com intervalo None são fixas: coletadas uma vez e nunca expiram
+default_intervals = {
+    "facts": None,
+    "system": None,
+    "cpu": 1.0,
+    "ram": 1.0,
+    "disk": 5.0,
+    "network": 5.0,
+    "processes": 3.0,
+}
+
+
+class Snapshot(object):
+    """Uma amostra de uma métrica, com versão e horário da coleta"""
+
+    __slots__ = ("name", "data", "version", "timestamp", "_bodies", "_body_lock")
+
+    def __init__(self, name: str, data, version: int, timestamp: float):
+        self.name = name
+        self.data = data
+        self.version = version
+        self.timestamp = timestamp
+
+        self._bodies = {}
+        self._body_lock = threading.Lock()
+
+    def age(self) -> float:
+        return time.monotonic() - self.timestamp
+
+    def body(self, codec: int = CODEC_COMPACT) -> bytes:
+        """Retorna os dados serializados no formato pedido, calculados uma única vez por amostra"""
+        body = self._bodies.get(codec)
+
+        if body is None:
+            with self._body_lock:
+                body = self._bodies.get(codec)
+
+                if body is None:
+                    body = encode_payload(self.data, codec, self.name)
+                    self._bodies[codec] = body
+
+        return body
+
+
+class MetricCache(object):
+    """Guarda a amostra mais recente de cada métrica"""
+
+    def __init__(self):
+        self._snapshots = {}
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def update(self, name: str, data) -> Snapshot:
+        """Substitui a amostra de uma métrica e incrementa sua versão"""
+        with self._lock:
+            version = self._versions.get(name, 0) + 1
+            self._versions[name] = version
+
+            snapshot = Snapshot(name, data, version, time.monotonic())
+            self._snapshots[name] = snapshot
+
+        return snapshot
+
+    def get(self, name: str):
+        """Retorna a amostra mais recente de uma métrica, ou None"""
+        return self._snapshots.get(name)
+
+
+class Sampler(object):
+    """Coleta cada métrica em segundo plano, no seu próprio intervalo, e guarda o resultado no cache"""
+
+    def __init__(self, collectors: dict, intervals: dict = None, cache: MetricCache = None):
+        self.collectors = collectors
+        self.intervals = {**default_intervals, **(intervals or {})}
+        self.cache = cache if cache is not None else MetricCache()
+        # Funções chamadas com cada amostra nova, na thread que a coletou
+        self.listeners = []
+
+        self._collect_locks = {name: threading.Lock() for name in collectors}
+        self._stop_event = threading.Event()
+        self._threads = []
+
+    def max_age(self, name: str) -> float:
+        """Idade máxima aceita para uma amostra antes de coletar novamente sob demanda"""
+        if self.intervals[name] is None:
+            return math.inf
+
+        return self.intervals[name] * 2
+
+    def start(self):
+        """Inicia uma thread de coleta por métrica"""
+        for name in self.collectors:
+            thread = threading.Thread(target=self._loop, args=(name,), name=f"amostragem-{name}", daemon=True)
+            thread.start()
+
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop_event.set()
+
+    def collect(self, name: str) -> Snapshot:
+        """Coleta uma métrica imediatamente e atualiza o cache"""
+        with self._collect_locks[name]:
+            return self._store(name, self.collectors[name]())
+
+    def _store(self, name: str, data) -> Snapshot:
+        snapshot = self.cache.update(name, data)
+
+        for listener in self.listeners:
+            try:
+                listener(snapshot)
+            except Exception as error:
+                print(f"Falha ao processar a amostra de {name}: {error}")
+
+        return snapshot
+
+    def get(self, name: str, max_age: float = None) -> Snapshot:
+        """Retorna a amostra em cache, coletando de novo se ela não existir ou estiver velha demais"""
+        if name not in self.collectors:
+            raise KeyError(name)
+
+        if max_age is None:
+            max_age = self.max_age(name)
+
+        snapshot = self.cache.get(name)
+
+        if snapshot is not None and snapshot.age() <= max_age:
+            return snapshot
+
+        with self._collect_locks[name]:
+            snapshot = self.cache.get(name)
+
+            if snapshot is not None and snapshot.age() <= max_age:
+                return snapshot
+
+            return self._store(name, self.collectors[name]())
+
+    def _loop(self, name: str):
+        while not self._stop_event.is_set():
+            started = time.monotonic()
+
+            try:
+                self.collect(name)
+            except Exception as error:
+                print(f"Falha ao coletar {name}: {error}")
+
+            if self.intervals[name] is None:
+                break
+
+            self._stop_event.wait(max(0.0, self.intervals[name] - (time.monotonic() - started)))
@@ -1,17 +1,63 @@
+import argparse
+import asyncio
+import json
+import math
+import os
 import platform
-import pickle
 import socket
 import sys
 import threading
 import time
-from queue import Queue
+from concurrent.futures import ThreadPoolExecutor
 
 import cpuinfo
-import nmap
 import psutil
 
+from PB_alerts import AlertEngine
+from PB_codec import CODEC_COMPACT, CODEC_PICKLE
+from PB_exporter import MetricsExporter
+from PB_history import HistoryStore
+from PB_network import NetworkInventory, parse_ports
+from PB_processes import ProcessCollector, ProcessQuery, ProcessQueryCache, ProcessTableStream
+from PB_protocol import (
+    FrameReader,
+    MAX_REQUEST_SIZE,
+    MESSAGE_ERROR,
+    MESSAGE_PUSH,
+    MESSAGE_REQUEST,
+    MESSAGE_RESPONSE,
+    MESSAGE_SUBSCRIBE,
+    MESSAGE_UNSUBSCRIBE,
+    ProtocolError,
+    encode_message,
+    encode_payload,
+    frame_message,
+)
+from PB_sampler import Sampler
+
 gb = 1024 * 1024 * 1024
 
+min_push_interval = 0.1
+# Quantidade máxima de métricas em uma requisição em lote
+max_batch_size = 32
+# Quantidade máxima de linhas (ou intervalos, com points) na resposta de uma consulta ao histórico
+max_history_points = 4096
+
+
+class RequestError(Exception):
+    """Requisição que não pode ser atendida; a mensagem é enviada ao cliente"""
+
+
+def parse_since(value) -> int:
+    """Valida a última sequência conhecida pelo cliente, que vem direto da requisição"""
+    if value is None:
+        return 0
+
+    if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+        raise RequestError(f"Sequência inválida: {value!r}")
+
+    return value
+
 
 def get_plataform_info():
     return {
@@ -26,7 +72,59 @@ def get_plataform_info():
     }
 
 
-def get_cpu_info():
+def cpu_times_totals(cpu_times):
+    """Retorna o tempo ocioso e o tempo total de uma leitura de cpu_times"""
+    total = sum(cpu_times)
+    # No Linux o tempo de guest já está contido em user e nice
+    total -= getattr(cpu_times, "guest", 0.0) + getattr(cpu_times, "guest_nice", 0.0)
+    idle = cpu_times.idle + getattr(cpu_times, "iowait", 0.0)
+
+    return idle, total
+
+
+def usage_percent(busy: float, total: float) -> float:
+    if total <= 0:
+        return 0.0
+
+    return round(min(max(busy / total * 100, 0.0), 100.0), 1)
+
+
+class CpuUsageSampler(object):
+    """Calcula o uso da CPU pela diferença entre a leitura atual e a anterior de cpu_times, sem bloquear"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._previous = psutil.cpu_times(percpu=True)
+
+    def sample(self):
+        """Retorna o uso geral e o uso por núcleo na mesma janela de tempo"""
+        with self._lock:
+            current = psutil.cpu_times(percpu=True)
+            previous, self._previous = self._previous, current
+
+        cores_usage = []
+        busy_sum = 0.0
+        total_sum = 0.0
+
+        for before, after in zip(previous, current):
+            idle_before, total_before = cpu_times_totals(before)
+            idle_after, total_after = cpu_times_totals(after)
+
+            total = total_after - total_before
+            busy = total - (idle_after - idle_before)
+
+            busy_sum += busy
+            total_sum += total
+
+            cores_usage.append(usage_percent(busy, total))
+
+        return usage_percent(busy_sum, total_sum), cores_usage
+
+
+cpu_usage_sampler = CpuUsageSampler()
+
+
+def get_cpu_facts():
     cpu_info = cpuinfo.get_cpu_info()
     cpu_freq = psutil.cpu_freq()
 
@@ -36,11 +134,80 @@ def get_cpu_info():
         "bits": cpu_info["bits"],
         "min_frequency": round(cpu_freq.min, 2),
         "max_frequency": round(cpu_freq.max, 2),
-        "current_frequency": round(cpu_freq.current, 2),
         "physical_cores_number": psutil.cpu_count(logical=False),
         "cores_number": psutil.cpu_count(logical=True),
-        "usage": psutil.cpu_percent(interval=1),
-        "cores_usage": psutil.cpu_percent(interval=1, percpu=True),
+    }
+
+
+class HostFacts(object):
+    """Informações da máquina que não mudam enquanto ela estiver ligada, calculadas uma única vez"""
+
+    def __init__(self, cache_path: str = None):
+        self.cache_path = cache_path
+        self._facts = None
+        self._lock = threading.Lock()
+
+    def get(self) -> dict:
+        if self._facts is None:
+            with self._lock:
+                if self._facts is None:
+                    self._facts = self._load()
+
+        return self._facts
+
+    @staticmethod
+    def _cache_key() -> dict:
+        return {"node": platform.node(), "boot_time": int(psutil.boot_time())}
+
+    def _load(self) -> dict:
+        """Lê as informações do arquivo de cache, se ele for desta inicialização, ou as calcula"""
+        key = self._cache_key()
+
+        if self.cache_path is not None:
+            try:
+                with open(self.cache_path, encoding="utf-8") as cache_file:
+                    cached = json.load(cache_file)
+
+                if cached.get("key") == key:
+                    return cached["facts"]
+            except (OSError, ValueError, KeyError):
+                pass
+
+        facts = {"system": get_plataform_info(), "cpu": get_cpu_facts()}
+
+        if self.cache_path is not None:
+            try:
+                cache_dir = os.path.dirname(self.cache_path)
+
+                if cache_dir:
+                    os.makedirs(cache_dir, exist_ok=True)
+
+                with open(self.cache_path, "w", encoding="utf-8") as cache_file:
+                    json.dump({"key": key, "facts": facts}, cache_file)
+            except OSError as error:
+                print(f"Não foi possível salvar o cache de informações da máquina: {error}")
+
+        return facts
+
+
+host_facts = HostFacts()
+
+
+def get_host_facts():
+    return host_facts.get()
+
+
+def get_system_info():
+    return host_facts.get()["system"]
+
+
+def get_cpu_info():
+    usage, cores_usage = cpu_usage_sampler.sample()
+
+    return {
+        "current_frequency": round(psutil.cpu_freq().current, 2),
+        "usage": usage,
+        "cores_usage": cores_usage,
     }
 
 
@@ -53,6 +220,10 @@ def get_ram_info():
         "available_gb": round(ram_info.available / gb, 2),
         "percent_usage": ram_info.percent,
         "percent_available": round(100 - ram_info.percent, 1),
+        # Valores exatos do psutil, usados pelo exportador de métricas
+        "total_bytes": ram_info.total,
+        "used_bytes": ram_info.used,
+        "available_bytes": ram_info.available,
     }
 
 
@@ -65,120 +236,466 @@ def get_disk_info():
         "available_gb": round(disk_usage.free / gb, 2),
         "used_percent": disk_usage.percent,
         "available_percent": round(100 - disk_usage.percent, 1),
+        "total_bytes": disk_usage.total,
+        "used_bytes": disk_usage.used,
+        "available_bytes": disk_usage.free,
     }
 
 
+network_inventory = NetworkInventory()
+
+
 def get_network_info():
-    interfaces = []
+    return network_inventory.info()
+
 
-    for interface_name, interface_addresses in psutil.net_if_addrs().items():
-        for address in interface_addresses:
-            if address.family == socket.AF_INET:
-                interfaces.append({
-                    "interface": interface_name,
-                    "address": address.address,
-                    "netmask": address.netmask if address.netmask is not None else "Ausente",
-                })
+process_collector = ProcessCollector()
 
-    nm = nmap.PortScanner()
-    nm.scan("127.0.0.1", "22-443")
-    nm.command_line()
-    nm.scaninfo()
 
-    hosts = []
+def get_processes():
+    return process_collector.collect()
 
-    for host in nm.all_hosts():
-        host_info = {
-            "host": host, 
-            "name": nm[host].hostname(),
-            "state": nm[host].state(), 
-            "protocols": []
-        }
 
-        for protocol in nm[host].all_protocols():
-            protocol = {"protocol": protocol, "ports": []}
+collectors = {
+    "facts": get_host_facts,
+    "system": get_system_info,
+    "cpu": get_cpu_info,
+    "ram": get_ram_info,
+    "disk": get_disk_info,
+    "network": get_network_info,
+    "processes": get_processes,
+}
 
-            ports_list = nm[host][protocol["protocol"]].keys()
-            list(ports_list).sort()
-            for port in ports_list:
-                protocol["ports"].append({"port": port, "state": nm[host][protocol["protocol"]][port]["state"]})
 
-            host_info["protocols"].append(protocol)
+class ClientConnection(asyncio.BufferedProtocol):
+    """Recebe as mensagens de um cliente e envia as respostas pela mesma conexão"""
 
-    return {"interfaces": interfaces, "hosts": hosts}
+    def __init__(self, server):
+        self._server = server
+        # Conexões sem autenticação: as requisições são pequenas, então o limite também é
+        self._frame_reader = FrameReader(allowed_codecs=server.allowed_codecs, max_message_size=MAX_REQUEST_SIZE)
+        self.transport = None
+        self.address = None
+        self.subscriptions = {}
 
+    def connection_made(self, transport):
+        self.transport = transport
+        self.address = transport.get_extra_info("peername")
 
-def get_processes():
-    processes = []
+        self._server.clients.add(self)
+
+        print(f"Conexão estabelecida com {self.address[0]}:{self.address[1]}")
 
-    pids = psutil.pids()
-    pids.reverse()
+    def connection_lost(self, exc):
+        self._server.clients.discard(self)
+
+        for subscription in self.subscriptions.values():
+            subscription.cancel()
+
+        self.subscriptions.clear()
+
+        print(f"Conexão encerrada com {self.address[0]}:{self.address[1]}")
+
+    def get_buffer(self, sizehint):
+        return self._frame_reader.get_buffer()
+
+    def buffer_updated(self, nbytes):
+        self._frame_reader.buffer_updated(nbytes)
 
-    for pid in pids:
-        process = psutil.Process(pid)
         try:
-            process_data = {
-                "name": process.name(),
-                "used_memory": process.memory_info().rss / 1024 / 1024,
-                "memory_use_percent": process.memory_percent(),
-                "used_threads": process.num_threads(),
-                "created_time": process.cpu_times().user,
-                "created_date": time.ctime(process.create_time()),
-            }
-            processes.append(process_data)
-        except:
-            pass
-
-    return processes
-
-
-queue_data = Queue()
-
-
-def get_data(data_name: str, request_uuid: str):
-    get_info = {
-        "system": get_plataform_info,
-        "cpu": get_cpu_info,
-        "ram": get_ram_info,
-        "disk": get_disk_info,
-        "network": get_network_info,
-        "processes": get_processes,
-    }
+            for message_type, request_id, request, codec in self._frame_reader.messages():
+                self._server.handle_message(self, message_type, request_id, request, codec)
+        except ProtocolError as error:
+            print(f"Mensagem inválida de {self.address[0]}:{self.address[1]}: {error}")
+            self.transport.close()
+
+    def send_raw(self, message: bytes):
+        """Envia uma mensagem já serializada, se a conexão ainda estiver aberta"""
+        if not self.transport.is_closing():
+            self.transport.write(message)
+
+
+class MonitoringServer(object):
+    """Aceita vários clientes ao mesmo tempo e coleta as métricas fora da thread de I/O"""
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        sampler: Sampler,
+        workers: int = 4,
+        allow_pickle: bool = False,
+        history: HistoryStore = None,
+        alerts: AlertEngine = None,
+        metrics_port: int = None,
+    ):
+        self.host = host
+        self.port = port
+        self.sampler = sampler
+        self.history = history
+        self.alerts = alerts
+        # Endpoint HTTP opcional no formato do Prometheus, servido no mesmo loop
+        self.exporter = MetricsExporter(sampler, host, metrics_port) if metrics_port else None
+        # Pickle executa código ao ser desserializado, então só é aceito se explicitamente permitido
+        self.allowed_codecs = {CODEC_COMPACT, CODEC_PICKLE} if allow_pickle else {CODEC_COMPACT}
+        self.process_stream = ProcessTableStream()
+        self.process_queries = ProcessQueryCache()
+        self.clients = set()
+
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="coleta")
+        self._loop = None
+
+    def handle_message(self, connection: ClientConnection, message_type: int, request_id: int, request, codec: int):
+        """Encaminha uma mensagem recebida para o tratamento adequado, respondendo no mesmo formato"""
+        if message_type in (MESSAGE_REQUEST, MESSAGE_SUBSCRIBE) and not isinstance(request, dict):
+            connection.send_raw(encode_message(MESSAGE_ERROR, request_id, "A requisição deve ser um dicionário", codec))
+            return
+
+        if message_type == MESSAGE_REQUEST:
+            self._loop.create_task(self._answer(connection, request_id, request, codec))
+        elif message_type == MESSAGE_SUBSCRIBE:
+            previous = connection.subscriptions.pop(request_id, None)
+
+            if previous is not None:
+                previous.cancel()
+
+            try:
+                interval = self._push_interval(request)
+            except RequestError as error:
+                connection.send_raw(encode_message(MESSAGE_ERROR, request_id, str(error), codec))
+                return
+
+            connection.subscriptions[request_id] = self._loop.create_task(
+                self._push(connection, request_id, request, interval, codec)
+            )
+        elif message_type == MESSAGE_UNSUBSCRIBE:
+            subscription = connection.subscriptions.pop(request_id, None)
+
+            if subscription is not None:
+                subscription.cancel()
+        else:
+            connection.send_raw(
+                encode_message(MESSAGE_ERROR, request_id, f"Tipo de mensagem desconhecido: {message_type}", codec)
+            )
+
+    async def _answer(self, connection: ClientConnection, request_id: int, request, codec: int):
+        _, message = await self._respond(MESSAGE_RESPONSE, request_id, request, codec)
+
+        connection.send_raw(message)
+
+    async def _respond(self, message_type: int, request_id: int, request, codec: int):
+        """Monta a resposta fora da thread de I/O; um lote tem cada métrica montada em paralelo"""
+        if request.get("data") == "batch":
+            return await self._build_batch(message_type, request_id, request, codec)
+
+        return await self._loop.run_in_executor(
+            self._executor, self._build_response, message_type, request_id, request, codec
+        )
+
+    def _push_interval(self, request) -> float:
+        """Intervalo de envio de uma assinatura: o pedido pelo cliente ou o da coleta da métrica"""
+        name = request.get("data")
+
+        # O nome é usado como chave nos dicionários do Sampler, então precisa ser um texto
+        if not isinstance(name, str):
+            raise RequestError(f"Métrica inválida: {name!r}")
+
+        interval = request.get("interval")
+
+        if interval is None:
+            interval = self.sampler.intervals.get(name) or 1.0
+
+        if (
+            not isinstance(interval, (int, float))
+            or isinstance(interval, bool)
+            or not math.isfinite(interval)
+            or interval <= 0
+        ):
+            raise RequestError(f"Intervalo inválido: {interval!r}")
+
+        return max(float(interval), min_push_interval)
+
+    async def _push(self, connection: ClientConnection, subscription_id: int, request, interval: float, codec: int):
+        """Envia a métrica assinada no intervalo pedido, apenas quando existe uma amostra nova"""
+        last_version = None
+        failed = False
+
+        while True:
+            version, message = await self._respond(MESSAGE_PUSH, subscription_id, request, codec)
+
+            if version is None:
+                # O erro é enviado uma vez; a assinatura continua e volta a enviar quando a métrica se recuperar
+                if not failed:
+                    connection.send_raw(message)
+
+                if not self._serves(request):
+                    return
+
+                failed = True
+            elif version != last_version:
+                connection.send_raw(message)
+                failed = False
+
+            last_version = version
+
+            await asyncio.sleep(interval)
+
+    def _serves(self, request) -> bool:
+        """Se a métrica pedida existe neste servidor; a assinatura de uma métrica desconhecida termina no erro"""
+        return request.get("data") in self.sampler.collectors or request.get("data") in ("batch", "history", "alerts")
+
+    def _build_body(self, request, codec: int):
+        """Serializa a métrica pedida a partir da amostra em cache e retorna a versão usada e o corpo"""
+        name = request.get("data")
+
+        if name == "history":
+            return self._build_history(request, codec)
 
-    queue_data.put({"uuid": request_uuid, "data": get_info[data_name]()})
+        if name == "alerts":
+            if self.alerts is None:
+                raise RequestError("Os alertas estão desativados no servidor")
 
+            # Como na tabela de processos, cada envio de uma assinatura parte do último evento enviado
+            request["since"], body = self.alerts.body(parse_since(request.get("since")), codec)
 
-socket_object = socket.socket()
-host = socket.gethostname()
-print()
-port = int(input("Informe a porta do servidor: "))
-socket_object.bind((host, port))
+            return request["since"], body
 
-print()
+        if name not in self.sampler.collectors:
+            raise RequestError(f"Métrica desconhecida: {name}")
 
-print("Servidor iniciado")
+        try:
+            snapshot = self.sampler.get(name)
+        except Exception as error:
+            raise RequestError(f"Falha ao coletar {name}: {error}") from error
+
+        if name == "processes" and "query" in request:
+            try:
+                query = ProcessQuery.from_request(request["query"])
+            except ValueError as error:
+                raise RequestError(f"Consulta inválida: {error}") from error
+
+            return snapshot.version, self.process_queries.body(snapshot, query, codec)
+
+        if name == "processes" and "since" in request:
+            # Nas assinaturas a próxima diferença parte da última sequência enviada
+            request["since"], body = self.process_stream.body(snapshot, parse_since(request["since"]), codec)
+
+            return snapshot.version, body
+
+        return snapshot.version, snapshot.body(codec)
 
-socket_object.listen(5)
-connection, addr = socket_object.accept()
+    def _build_history(self, request, codec: int):
+        """Consulta um intervalo de uma série do histórico; sem série, lista as séries gravadas"""
+        if self.history is None:
+            raise RequestError("O histórico está desativado no servidor")
 
-print(f"Conexão estabelecida com {addr[0]}:{addr[1]}")
+        series = request.get("series")
+        known_series = self.history.series()
 
-while True:
-    if queue_data.empty():
-        received_data = connection.recv(1024)
+        if series is None:
+            return self.history.version, encode_payload({"series": known_series}, codec)
 
-        if not received_data:
-            print("Servidor encerrado")
-            break
+        if series not in known_series:
+            raise RequestError(f"Série desconhecida: {series}")
 
-        formatted_data = pickle.loads(received_data)
+        try:
+            now = time.time()
+            # Valores negativos (ou zero) são relativos ao horário atual, ex.: start=-21600 para as últimas 6 horas
+            start = float(request.get("start", -3600))
+            start = start + now if start <= 0 else start
+            end = request.get("end")
+            end = None if end is None else (float(end) + now if float(end) <= 0 else float(end))
+            step = request.get("step")
+            step = None if step is None else float(step)
+            # Com points a resposta tem no máximo points intervalos, qualquer que seja o período pedido
+            points = request.get("points")
+            points = None if points is None else min(int(points), max_history_points)
+
+            result = self.history.query(series, start, end, step, points, max_history_points)
+        except (TypeError, ValueError) as error:
+            raise RequestError(f"Consulta ao histórico inválida: {error}") from error
+
+        return self.history.version, encode_payload(result, codec)
+
+    def _build_response(self, message_type: int, request_id: int, request, codec: int):
+        """Monta a mensagem e retorna também a versão usada (None em caso de erro)"""
+        try:
+            version, body = self._build_body(request, codec)
+        except RequestError as error:
+            return None, encode_message(MESSAGE_ERROR, request_id, str(error), codec)
+        except Exception as error:
+            # Qualquer outra falha também vira uma resposta de erro, para o cliente não esperar até o timeout
+            print(f"Falha ao responder {request.get('data')!r}: {error!r}")
+            return None, encode_message(MESSAGE_ERROR, request_id, f"Requisição inválida: {error}", codec)
+
+        return version, frame_message(message_type, request_id, body, codec)
+
+    def _build_batch_item(self, request, codec: int):
+        if not isinstance(request, dict):
+            return None, {"error": "Item do lote inválido"}
+
+        try:
+            version, body = self._build_body(request, codec)
+        except RequestError as error:
+            return None, {"data": request.get("data"), "error": str(error)}
+        except Exception as error:
+            print(f"Falha ao responder {request.get('data')!r} no lote: {error!r}")
+            return None, {"data": request.get("data"), "error": f"Requisição inválida: {error}"}
 
-        get_data_thread = threading.Thread(target=get_data, args=(formatted_data["data"], formatted_data["uuid"]))
-        get_data_thread.start()
+        return version, {"data": request.get("data"), "body": body}
 
-    else:
-        connection.send(pickle.dumps(queue_data.get()))
+    async def _build_batch(self, message_type: int, request_id: int, request, codec: int):
+        """Responde várias métricas em uma única mensagem, reaproveitando o corpo já serializado de cada uma"""
+        requests = request.get("requests")
 
-connection.close()
-socket.close(0)
-sys.exit()
+        if not isinstance(requests, list) or not requests or len(requests) > max_batch_size:
+            error = f"Um lote deve ter de 1 a {max_batch_size} métricas"
+            return None, encode_message(MESSAGE_ERROR, request_id, error, codec)
+
+        results = await asyncio.gather(*(
+            self._loop.run_in_executor(self._executor, self._build_batch_item, item, codec) for item in requests
+        ))
+
+        # A versão do lote muda quando qualquer uma das métricas muda
+        version = tuple(item_version for item_version, _ in results)
+
+        return version, encode_message(message_type, request_id, [result for _, result in results], codec)
+
+    async def serve(self):
+        """Executa o servidor até ser interrompido"""
+        self._loop = asyncio.get_running_loop()
+
+        self.sampler.start()
+
+        server = await self._loop.create_server(lambda: ClientConnection(self), self.host, self.port)
+
+        if self.exporter is not None:
+            await self.exporter.start()
+
+        print("Servidor iniciado")
+
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.sampler.stop()
+
+            if self.exporter is not None:
+                await self.exporter.stop()
+
+            if self.history is not None:
+                self.history.close()
+
+            if self.alerts is not None:
+                self.alerts.close()
+
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor de monitoramento")
+    parser.add_argument("--host", default=socket.gethostname(), help="endereço em que o servidor escuta")
+    parser.add_argument("--port", type=int, help="porta do servidor")
+    parser.add_argument("--workers", type=int, default=4, help="threads usadas para responder as requisições")
+    parser.add_argument(
+        "--interval",
+        action="append",
+        default=[],
+        metavar="METRICA=SEGUNDOS",
+        help="intervalo de coleta de uma métrica, ex.: --interval cpu=2",
+    )
+    parser.add_argument(
+        "--scan-target",
+        action="append",
+        default=[],
+        help="endereço verificado pela varredura de portas (pode ser repetido)",
+    )
+    parser.add_argument("--scan-ports", default="22-443", help="portas verificadas, ex.: 22-443,8080")
+    parser.add_argument("--scan-interval", type=float, default=300.0, help="segundos entre as varreduras de portas")
+    parser.add_argument("--scan-ttl", type=float, default=900.0, help="segundos em que o resultado de uma varredura é válido")
+    parser.add_argument(
+        "--legacy-pickle",
+        action="store_true",
+        help="aceita mensagens em pickle de clientes antigos (inseguro em redes não confiáveis)",
+    )
+    parser.add_argument("--facts-cache", help="arquivo onde as informações fixas da máquina são guardadas entre execuções")
+    parser.add_argument("--history-dir", help="diretório onde o histórico das métricas é gravado (desativado se omitido)")
+    parser.add_argument(
+        "--history-retention", type=float, default=7 * 86400.0, help="segundos em que o histórico é mantido"
+    )
+    parser.add_argument(
+        "--history-segment", type=float, default=3600.0, help="segundos cobertos por cada arquivo do histórico"
+    )
+    parser.add_argument("--alert-rules", help="arquivo JSON com as regras de alerta avaliadas a cada amostra")
+    parser.add_argument("--alert-log", default="PB_alerts.log", help="arquivo onde os eventos de alerta são gravados")
+    parser.add_argument("--metrics-port", type=int, help="porta do endpoint HTTP /metrics no formato do Prometheus")
+    args = parser.parse_args()
+
+    intervals = {}
+
+    for interval in args.interval:
+        name, _, seconds = interval.partition("=")
+
+        if name not in collectors:
+            parser.error(f"métrica desconhecida: {name}")
+
+        intervals[name] = float(seconds)
+
+    if args.port is None:
+        print()
+        args.port = int(input("Informe a porta do servidor: "))
+
+    print()
+
+    try:
+        parse_ports(args.scan_ports)
+    except ValueError:
+        parser.error(f"lista de portas inválida: {args.scan_ports}")
+
+    host_facts.cache_path = args.facts_cache
+
+    network_inventory.targets = args.scan_target or network_inventory.targets
+    network_inventory.ports = args.scan_ports
+    network_inventory.interval = args.scan_interval
+    network_inventory.ttl = args.scan_ttl
+    network_inventory.start()
+
+    sampler = Sampler(collectors, intervals)
+    history = None
+
+    if args.history_dir:
+        history = HistoryStore(args.history_dir, args.history_segment, args.history_retention)
+        sampler.listeners.append(history.record)
+
+    alerts = None
+
+    if args.alert_rules:
+        try:
+            alerts = AlertEngine.load(args.alert_rules, args.alert_log)
+        except (OSError, ValueError) as error:
+            parser.error(f"não foi possível carregar as regras de alerta: {error}")
+
+        sampler.listeners.append(alerts.evaluate)
+
+    server = MonitoringServer(
+        args.host,
+        args.port,
+        sampler,
+        workers=args.workers,
+        allow_pickle=args.legacy_pickle,
+        history=history,
+        alerts=alerts,
+        metrics_port=args.metrics_port,
+    )
+
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
+
+    print("Servidor encerrado")
+    sys.exit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import threading
+
+import numpy as np
+
+
+class RingBuffer(object):
+    """Buffer circular de capacidade fixa, com inserção O(1) e janelas contíguas sem cópia"""
+
+    def __init__(self, capacity: int, width: int = 1, dtype=np.float32):
+        self.capacity = capacity
+        self.width = width
+
+        # Cada amostra é gravada nas posições i e i + capacidade, assim as últimas n amostras
+        # sempre formam uma fatia contígua do array
+        self._data = np.zeros((capacity * 2, width), dtype=dtype)
+        self._next = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, values):
+        """Adiciona uma amostra (um valor por coluna)"""
+        index = self._next
+
+        self._data[index] = values
+        self._data[index + self.capacity] = values
+
+        self._next = (index + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def window(self, size: int = None) -> np.ndarray:
+        """Retorna uma view das últimas size amostras, da mais antiga para a mais nova"""
+        size = self._count if size is None else min(size, self._count)
+        end = self._next + self.capacity
+
+        return self._data[end - size:end]
+
+    def last(self):
+        """Última amostra, ou None se o buffer estiver vazio"""
+        if not self._count:
+            return None
+
+        return self._data[self._next + self.capacity - 1]
+
+
+class TimeSeriesStore(object):
+    """Guarda o histórico de cada métrica em um RingBuffer com a mesma profundidade"""
+
+    def __init__(self, depth: int = 3600, dtype=np.float32):
+        self.depth = depth
+        self.dtype = dtype
+
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def append(self, key: str, values):
+        """Adiciona uma amostra; uma lista de valores é guardada como uma coluna por item (ex.: por núcleo)"""
+        width = len(values) if isinstance(values, (list, tuple, np.ndarray)) else 1
+
+        with self._lock:
+            series = self._series.get(key)
+
+            if series is None or series.width != width:
+                series = RingBuffer(self.depth, width, self.dtype)
+                self._series[key] = series
+
+            series.append(values)
+
+    def window(self, key: str, size: int = None) -> np.ndarray:
+        """Últimas size amostras de uma métrica, com formato (amostras, colunas)"""
+        with self._lock:
+            series = self._series.get(key)
+
+            if series is None:
+                return np.zeros((0, 1), dtype=self.dtype)
+
+            return series.window(size)
+
+    def last(self, key: str):
+        with self._lock:
+            series = self._series.get(key)
+
+            return series.last() if series is not None else None
+
+    def nbytes(self) -> int:
+        """Memória ocupada pelos buffers, fixa depois que todas as métricas foram criadas"""
+        with self._lock:
+            return sum(series._data.nbytes for series in self._series.values())
@@ -0,0 +1,405 @@
+import bisect
+import html
+import re
+import threading
+
+import pygame
+import pygame_gui
+
+
+class TextView(object):
+    """Mantém o conteúdo de uma UITextBox e só a reconstrói quando o texto muda"""
+
+    def __init__(self, text_box):
+        self.text_box = text_box
+        self.rebuilds = 0
+
+        self._html = text_box.html_text
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def set_html(self, html: str):
+        """Troca o texto; pode ser chamado de qualquer thread, a reconstrução fica para o próximo frame"""
+        with self._lock:
+            if html != self._html:
+                self._html = html
+                self._dirty = True
+
+    def set_lines(self, header: str, lines):
+        self.set_html("<br>".join([header, *lines]))
+
+    def refresh(self) -> bool:
+        """Reconstrói a caixa de texto se o conteúdo mudou; deve ser chamado na thread da interface"""
+        with self._lock:
+            if not self._dirty:
+                return False
+
+            html = self._html
+            self._dirty = False
+
+        self.text_box.html_text = html
+        self.text_box.rebuild()
+        self.rebuilds += 1
+
+        return True
+
+
+class RowCache(object):
+    """Guarda as linhas já formatadas, indexadas pelos valores dos campos exibidos"""
+
+    def __init__(self, fields: list, formatter, capacity: int = 4096):
+        self.fields = fields
+        self.formatter = formatter
+        self.capacity = capacity
+
+        self._rows = {}
+
+    def format(self, record: dict) -> str:
+        key = tuple([record[field] for field in self.fields])
+        row = self._rows.get(key)
+
+        if row is None:
+            if len(self._rows) >= self.capacity:
+                self._rows.clear()
+
+            row = self.formatter(*key)
+            self._rows[key] = row
+
+        return row
+
+
+def compile_filter(text: str):
+    """Converte o texto do filtro em uma função de busca: "re:" no início indica uma expressão regular.
+
+    Uma expressão regular inválida gera ValueError, em vez de virar uma busca pelo texto."""
+    if not text:
+        return None
+
+    if text.startswith("re:"):
+        try:
+            return re.compile(text[3:], re.IGNORECASE).search
+        except re.error as error:
+            raise ValueError(f"Expressão regular inválida: {error}") from None
+
+    needle = text.lower()
+
+    return lambda value: needle in value.lower()
+
+
+class TableModel(object):
+    """Registros indexados por uma chave, mantidos na ordem da coluna escolhida conforme as atualizações chegam"""
+
+    def __init__(self, key_field: str, sort_field: str, descending: bool = False, filter_field: str = "name"):
+        self.key_field = key_field
+        self.sort_field = sort_field
+        self.descending = descending
+        self.filter_field = filter_field
+        self.version = 0
+
+        self._rows = {}
+        # Chaves de ordenação em ordem crescente; a ordem decrescente é lida de trás para frente
+        self._order = []
+        self._sort_keys = {}
+
+        self._filter = None
+        self._matches = {}
+        self._filtered = None
+
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _sort_key(self, row: dict) -> tuple:
+        value = row.get(self.sort_field)
+
+        # Valores ausentes ficam sempre no fim, em qualquer direção
+        return (value is None) != self.descending, value, row[self.key_field]
+
+    def _insert(self, row: dict):
+        sort_key = self._sort_key(row)
+        self._sort_keys[row[self.key_field]] = sort_key
+        bisect.insort(self._order, sort_key)
+
+    def _remove(self, key):
+        sort_key = self._sort_keys.pop(key, None)
+
+        if sort_key is not None:
+            del self._order[bisect.bisect_left(self._order, sort_key)]
+
+    def _resort(self):
+        self._sort_keys = {key: self._sort_key(row) for key, row in self._rows.items()}
+        self._order = sorted(self._sort_keys.values())
+
+    def _changed(self):
+        self._filtered = None
+        self.version += 1
+
+    def replace(self, rows: list):
+        """Substitui todos os registros"""
+        with self._lock:
+            self._rows = {row[self.key_field]: row for row in rows}
+            self._matches = {}
+            self._resort()
+            self._changed()
+
+    def apply(self, added: list, removed: list, changed: dict):
+        """Aplica as diferenças; poucas mudanças na coluna ordenada são reposicionadas sem ordenar tudo de novo"""
+        with self._lock:
+            moves = len(added) + len(removed) + sum(1 for fields in changed.values() if self.sort_field in fields)
+            incremental = moves <= len(self._order) // 8
+
+            for key in removed:
+                self._rows.pop(key, None)
+                self._matches.pop(key, None)
+
+                if incremental:
+                    self._remove(key)
+
+            for row in added:
+                key = row[self.key_field]
+                self._rows[key] = row
+                self._matches.pop(key, None)
+
+                if incremental:
+                    self._remove(key)
+                    self._insert(row)
+
+            for key, fields in changed.items():
+                row = self._rows.get(key)
+
+                if row is None:
+                    continue
+
+                if self.filter_field in fields:
+                    self._matches.pop(key, None)
+
+                if incremental and self.sort_field in fields:
+                    self._remove(key)
+                    row.update(fields)
+                    self._insert(row)
+                else:
+                    row.update(fields)
+
+            if not incremental:
+                self._resort()
+
+            self._changed()
+
+    def set_sort(self, field: str, descending: bool):
+        with self._lock:
+            self.sort_field = field
+            self.descending = descending
+            self._resort()
+            self._changed()
+
+    def set_filter(self, text: str):
+        matcher = compile_filter(text)
+
+        with self._lock:
+            self._filter = matcher
+            self._matches = {}
+            self._changed()
+
+    def _match(self, key) -> bool:
+        matched = self._matches.get(key)
+
+        if matched is None:
+            matched = bool(self._filter(str(self._rows[key].get(self.filter_field) or "")))
+            self._matches[key] = matched
+
+        return matched
+
+    def visible(self, offset: int, count: int):
+        """Registros da janela visível, na ordem atual, e o total de registros que passam pelo filtro"""
+        with self._lock:
+            order = self._order
+
+            if self._filter is None:
+                total = len(order)
+
+                if self.descending:
+                    start = total - 1 - offset
+                    keys = [order[index][-1] for index in range(start, max(start - count, -1), -1)]
+                else:
+                    keys = [sort_key[-1] for sort_key in order[offset:offset + count]]
+            else:
+                if self._filtered is None:
+                    ordered = reversed(order) if self.descending else order
+                    self._filtered = [sort_key[-1] for sort_key in ordered if self._match(sort_key[-1])]
+
+                total = len(self._filtered)
+                keys = self._filtered[offset:offset + count]
+
+            return [self._rows[key] for key in keys], total
+
+
+class Column(object):
+    """Coluna de uma TableView: campo exibido, título, largura em pixels, formato e escala do valor"""
+
+    def __init__(
+        self, field: str, title: str, width: int, spec: str = "", descending: bool = True, scale: float = None
+    ):
+        self.field = field
+        self.title = title
+        self.width = width
+        self.spec = spec
+        self.scale = scale
+        # Direção usada no primeiro clique no título
+        self.descending = descending
+
+    def format(self, value) -> str:
+        if value is None:
+            return "-"
+
+        return format(value * self.scale if self.scale is not None else value, self.spec)
+
+
+class TableView(object):
+    """Tabela virtualizada: só as linhas visíveis são formatadas e enviadas para as caixas de texto"""
+
+    font_size = 14
+    # Espaçamento entre linhas e margem interna usados pela UITextBox
+    line_spacing = 1.25
+    text_margin = 28
+    scroll_step = 3
+
+    def __init__(self, manager: pygame_gui.UIManager, rect: pygame.Rect, columns: list, model: TableModel):
+        self.columns = columns
+        self.model = model
+
+        self.font = manager.get_theme().get_font_dictionary().find_font(self.font_size, "noto_sans")
+        line_height = self.font.size("0")[1]
+
+        self.filter_entry = pygame_gui.elements.UITextEntryLine(
+            relative_rect=pygame.Rect((rect.left + 5, rect.top + 5), (400, 30)),
+            manager=manager,
+            placeholder_text="Filtrar por nome (re: para expressão regular)",
+        )
+        self.status_label = pygame_gui.elements.UILabel(
+            relative_rect=pygame.Rect((rect.right - 300, rect.top + 5), (295, 30)),
+            text="",
+            manager=manager,
+        )
+
+        # Cada coluna é uma caixa de texto própria, assim elas ficam alinhadas com qualquer fonte
+        self.header_buttons = {}
+        self.column_views = []
+        self._max_widths = []
+        left = rect.left
+        box_height = rect.height - 75
+
+        for column in columns:
+            button = pygame_gui.elements.UIButton(
+                relative_rect=pygame.Rect((left, rect.top + 40), (column.width, 30)),
+                text=column.title,
+                manager=manager,
+            )
+            self.header_buttons[button] = column
+
+            text_box = pygame_gui.elements.UITextBox(
+                relative_rect=pygame.Rect((left, rect.top + 75), (column.width, box_height)),
+                html_text="",
+                manager=manager,
+            )
+            self.column_views.append(TextView(text_box))
+            self._max_widths.append(column.width - self.text_margin)
+
+            left += column.width
+
+        # Linhas que cabem sem que as caixas de texto criem barra de rolagem
+        self.visible_rows = max(1, (box_height - 12) // round(line_height * self.line_spacing))
+
+        self.row_cache = RowCache(
+            [column.field for column in columns],
+            lambda *values: tuple([
+                html.escape(self._fit(column.format(value), max_width))
+                for column, value, max_width in zip(columns, values, self._max_widths)
+            ]),
+        )
+
+        self.offset = 0
+        self.total = 0
+        self.filter_error = None
+        self._shown = None
+
+    def _fit(self, text: str, max_width: int) -> str:
+        """Corta o texto para caber na coluna; uma linha quebrada desalinharia as colunas"""
+        if self.font.size(text)[0] <= max_width:
+            return text
+
+        while len(text) > 1 and self.font.size(text + "…")[0] > max_width:
+            text = text[:-1]
+
+        return text + "…"
+
+    def scroll(self, rows: int):
+        self.offset = max(0, min(self.offset + rows, self.total - self.visible_rows))
+
+    def page_up(self):
+        self.scroll(-self.visible_rows)
+
+    def page_down(self):
+        self.scroll(self.visible_rows)
+
+    def handle_event(self, event) -> bool:
+        """Trata cliques nos títulos, o filtro e a roda do mouse; retorna True se o evento era da tabela"""
+        if event.type == pygame.MOUSEWHEEL:
+            position = pygame.mouse.get_pos()
+
+            if any(view.text_box.rect.collidepoint(position) for view in self.column_views):
+                self.scroll(-event.y * self.scroll_step)
+                return True
+
+            return False
+
+        if event.type != pygame.USEREVENT:
+            return False
+
+        if event.user_type == pygame_gui.UI_BUTTON_PRESSED and event.ui_element in self.header_buttons:
+            column = self.header_buttons[event.ui_element]
+            descending = not self.model.descending if column.field == self.model.sort_field else column.descending
+
+            self.model.set_sort(column.field, descending)
+            self.offset = 0
+            return True
+
+        if event.user_type == pygame_gui.UI_TEXT_ENTRY_CHANGED and event.ui_element == self.filter_entry:
+            try:
+                self.model.set_filter(self.filter_entry.get_text())
+            except ValueError as error:
+                # Enquanto a expressão está incompleta o filtro anterior continua valendo
+                self.filter_error = str(error)
+            else:
+                self.filter_error = None
+                self.offset = 0
+
+            self._shown = None
+            return True
+
+        return False
+
+    def refresh(self):
+        """Formata as linhas visíveis se os dados, a ordem, o filtro ou a posição mudaram"""
+        if (self.model.version, self.offset) != self._shown:
+            rows, self.total = self.model.visible(self.offset, self.visible_rows)
+
+            if self.offset and self.offset > max(0, self.total - self.visible_rows):
+                # A lista encolheu: volta a mostrar as últimas linhas
+                self.scroll(0)
+                rows, self.total = self.model.visible(self.offset, self.visible_rows)
+
+            self._shown = (self.model.version, self.offset)
+
+            cells = [self.row_cache.format(row) for row in rows]
+
+            for index, view in enumerate(self.column_views):
+                view.set_html("<br>".join([row[index] for row in cells]))
+
+            first = self.offset + 1 if self.total else 0
+            self.status_label.set_text(
+                self.filter_error or f"{first}-{self.offset + len(rows)} de {self.total} ({len(self.model)} no total)"
+            )
+
+        for view in self.column_views:
+            view.refresh()
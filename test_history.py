@@ -0,0 +1,38 @@
+import pytest
+
+from PB_history import HistoryStore, decode_rollup
+
+
+@pytest.fixture
+def store(tmp_path):
+    history = HistoryStore(str(tmp_path))
+    start = 1_700_000_000.0
+
+    for second in range(20000):
+        history.append("cpu.usage", start + second, [float(second % 100)])
+
+    yield history, start
+
+    history.close()
+
+
+@pytest.mark.parametrize("points", [1, 7, 100, 333, 4096, 5000])
+@pytest.mark.parametrize("offset, span", [(0, 19999), (0.5, 12345.7), (13.3, 999.9), (101.1, 59.3)])
+def test_query_points_is_an_upper_bound(store, points, offset, span):
+    history, start = store
+
+    result = history.query("cpu.usage", start + offset, start + offset + span, points=points)
+
+    assert 0 < result["count"] <= points
+
+
+def test_query_points_includes_the_last_sample(store):
+    history, start = store
+
+    result = history.query("cpu.usage", start, start + 19999, points=5000)
+    timestamps, values = decode_rollup(result)
+
+    assert result["count"] <= 5000
+    # A amostra no fim do período entra no último intervalo, em vez de abrir um a mais
+    assert timestamps[-1] < start + 19999
+    assert values["last"][0, -1] == 19999 % 100